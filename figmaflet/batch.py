@@ -0,0 +1,111 @@
+import json
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from figmaflet.generateUI import UI
+from figmaflet.figma import endpoints
+from figmaflet import utils, shared_cache
+
+
+def load_manifest(path: Path) -> dict:
+    """Reads a batch manifest (YAML or JSON).
+
+    ```yaml
+    apitoken: YOUR_API_TOKEN   # default token for every file
+    workers: 4                 # optional, size of the worker pool
+    rate: 2                    # optional, max Figma API calls per second
+    max_image_memory: 512      # optional, MB of decoded images held at once
+    cache_dir: /var/cache/ff   # optional, cache shared with other processes
+    bundle_fonts: false        # optional, default for every file
+    bake_threshold: 50         # optional, default for every file
+    split: false               # optional, default for every file
+    min_list_items: 5          # optional, default for every file
+    resume: false              # optional, continue interrupted runs
+    densities: [1, 2, 3]       # optional, screen densities of the images
+    files:
+      - fileurl: FILE_KEY
+        output: ./screens/home
+      - fileurl: OTHER_KEY
+        output: ./screens/settings
+        apitoken: ANOTHER_TOKEN
+    ```
+    """
+    text = Path(path).read_text(encoding="UTF-8")
+    if Path(path).suffix.lower() in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError(
+                "YAML manifests require PyYAML: pip install figmaflet[batch]"
+            )
+        manifest = yaml.safe_load(text)
+    else:
+        manifest = json.loads(text)
+
+    if not manifest or not manifest.get("files"):
+        raise RuntimeError(f"No files listed in manifest {path}.")
+    for entry in manifest["files"]:
+        if not entry.get("apitoken", manifest.get("apitoken")):
+            raise RuntimeError(f"Missing apitoken for {entry.get('fileurl')}.")
+        if not entry.get("fileurl") or not entry.get("output"):
+            raise RuntimeError(f"Each file needs a fileurl and an output: {entry}")
+    return manifest
+
+
+def make_ui(entry: dict, token: str, defaults: dict) -> UI:
+    """Builds the UI of a manifest entry; its keys override the defaults."""
+    return UI(
+        token=token,
+        file_key=entry["fileurl"],
+        local_path=Path(entry["output"]),
+        bundle_fonts=entry.get("bundle_fonts", defaults.get("bundle_fonts", False)),
+        bake_threshold=entry.get("bake_threshold", defaults.get("bake_threshold")),
+        split=entry.get("split", defaults.get("split", False)),
+        min_list_items=entry.get("min_list_items", defaults.get("min_list_items", 5)),
+        resume=entry.get("resume", defaults.get("resume", False)),
+        densities=entry.get("densities", defaults.get("densities", (1,))),
+    )
+
+
+def generate_one(entry: dict, token: str, defaults: dict) -> dict:
+    start = time.perf_counter()
+    result = {"fileurl": entry["fileurl"], "output": entry["output"], "error": None}
+    try:
+        make_ui(entry, token, defaults).generate()
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(manifest: dict, workers=None, rate=None, max_image_memory=None) -> list:
+    """Generates every file of `manifest` in one process.
+
+    All files share a worker pool, the HTTP session, the font lookups, a
+    global Figma API rate budget and a bound on decoded image memory.
+    """
+    workers = workers or manifest.get("workers", 4)
+    endpoints.rate_limiter.rate = rate or manifest.get("rate")
+    max_image_memory = max_image_memory or manifest.get("max_image_memory")
+    utils.image_memory.limit = max_image_memory and max_image_memory * 2**20
+    if manifest.get("cache_dir") and shared_cache.cache is None:
+        shared_cache.configure(manifest["cache_dir"], manifest.get("cache_size"))
+
+    entries = manifest["files"]
+    tokens = [entry.get("apitoken", manifest.get("apitoken")) for entry in entries]
+    defaults = [manifest] * len(entries)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(generate_one, entries, tokens, defaults))
+
+
+def print_report(results: list, elapsed: float):
+    failed = [r for r in results if r["error"]]
+    for r in results:
+        status = f"FAILED: {r['error']}" if r["error"] else "ok"
+        print(f"  {r['fileurl']} -> {r['output']} ({r['seconds']:.2f}s) {status}")
+
+    print(
+        f"{len(results) - len(failed)}/{len(results)} files generated in {elapsed:.2f}s "
+        f"({len(results) / elapsed if elapsed else 0:.2f} files/s, "
+        f"{endpoints.rate_limiter.calls} Figma API calls)."
+    )
@@ -0,0 +1,134 @@
+"""Measures what a generated app costs to start: the time to import it and
+build its controls, how many controls it makes and how deeply they nest.
+
+`main(page)` runs against `StubPage` instead of a Flet session, so no window
+or server is started (Flet itself must be installed).
+"""
+
+import sys
+import time
+import importlib.util
+from pathlib import Path
+
+# Budget option -> report key it bounds
+BUDGETS = {
+    "max_startup_ms": "startup_ms",
+    "max_controls": "controls",
+    "max_depth": "depth",
+    "max_module_kb": "module_kb",
+}
+
+
+class StubPage:
+    """Stands in for `ft.Page`: keeps the added controls, renders nothing."""
+
+    def __init__(self, route="/"):
+        self.route = route
+        self.controls = []
+        self.padding = None
+        self.fonts = None
+        self.on_route_change = None
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+
+    def clean(self):
+        self.controls.clear()
+
+    def update(self, *controls):
+        pass
+
+
+def children(control) -> list:
+    # Flet controls list their child controls (content, controls...) here
+    get_children = getattr(control, "_get_children", None)
+    if get_children is not None:
+        return [child for child in get_children() if child is not None]
+    found = list(getattr(control, "controls", None) or [])
+    if getattr(control, "content", None) is not None:
+        found.append(control.content)
+    return found
+
+
+def count_controls(controls) -> tuple:
+    """Returns (number of controls, maximum nesting depth) of a control tree."""
+    count, depth = 0, 0
+    stack = [(control, 1) for control in controls]
+    while stack:
+        control, level = stack.pop()
+        count += 1
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in children(control))
+    return count, depth
+
+
+def import_app(path: Path):
+    """Imports a generated main.py without starting the app it launches."""
+    import flet
+
+    # `screens.*` of an earlier measure (watch mode) must be imported again
+    for name in [name for name in sys.modules if name.split(".")[0] == "screens"]:
+        del sys.modules[name]
+
+    spec = importlib.util.spec_from_file_location("figmaflet_app", path)
+    module = importlib.util.module_from_spec(spec)
+    app = flet.app
+    flet.app = lambda *args, **kwargs: None
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        flet.app = app
+    return module
+
+
+def measure(local_path: Path) -> dict:
+    """Runs the app generated in `local_path` and reports its startup cost.
+
+    Every route of a split app is shown once; controls and depth are those
+    of the largest screen, startup is the time to the first screen.
+    """
+    local_path = Path(local_path)
+    modules = [local_path / "main.py", *sorted(local_path.glob("screens/*.py"))]
+    report = {
+        "module_kb": sum(m.stat().st_size for m in modules if m.exists()) / 1024,
+        "screens": {},
+    }
+
+    sys.path.insert(0, str(local_path))
+    try:
+        start = time.perf_counter()
+        module = import_app(local_path / "main.py")
+        page = StubPage()
+        module.main(page)
+        report["startup_ms"] = (time.perf_counter() - start) * 1000
+        report["screens"]["/"] = count_controls(page.controls)
+
+        for route in getattr(module, "SCREENS", {}):
+            if route != "/":
+                page.route = route
+                page.on_route_change(None)
+                report["screens"][route] = count_controls(page.controls)
+    finally:
+        sys.path.remove(str(local_path))
+
+    report["controls"] = max(controls for controls, _ in report["screens"].values())
+    report["depth"] = max(depth for _, depth in report["screens"].values())
+    return report
+
+
+def over_budget(report: dict, budgets: dict) -> list:
+    """Returns a message for every budget (see `BUDGETS`) the report exceeds."""
+    return [
+        f"{key} is {report[key]:.0f}, over the budget of {budgets[option]}"
+        for option, key in BUDGETS.items()
+        if budgets.get(option) is not None and report[key] > budgets[option]
+    ]
+
+
+def print_measure(report: dict):
+    for route, (controls, depth) in report["screens"].items():
+        print(f"  {route}: {controls} controls, depth {depth}")
+    print(
+        f"Startup: {report['startup_ms']:.1f} ms, {report['controls']} controls, "
+        f"max nesting depth {report['depth']}, modules {report['module_kb']:.1f} KB"
+    )
@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import marshal
+import hashlib
+from collections import OrderedDict
+from pathlib import Path
+from figmaflet.utils import write_atomic
+from figmaflet.figma.vector_elements import CachedElement, position_code
+from figmaflet.document import json_loads, json_dumps
+
+# Keys that only locate a node on the canvas: the element's size is part of
+# the key instead and its position is filled in when the code is emitted, so
+# identical elements share an entry wherever they are.
+LOCATION_KEYS = (
+    "id",
+    "absoluteBoundingBox",
+    "absoluteRenderBounds",
+    "relativeTransform",
+)
+
+
+def strip_location(node: dict) -> dict:
+    node = {k: v for k, v in node.items() if k not in LOCATION_KEYS}
+    if "children" in node:
+        node["children"] = [strip_location(child) for child in node["children"]]
+    return node
+
+
+# Keys that name or identify a node without changing how it renders
+RENDER_IGNORED_KEYS = (
+    "id",
+    "name",
+    "pluginData",
+    "sharedPluginData",
+    "exportSettings",
+    "interactions",
+    "reactions",
+    "transitionNodeID",
+)
+BOX_KEYS = ("absoluteBoundingBox", "absoluteRenderBounds")
+
+
+def render_properties(node: dict, origin: dict, root: bool = True) -> dict:
+    """What a render of `node` depends on: its subtree without ids and names,
+    with boxes relative to `origin` (the rendered node's corner), so moving
+    or renaming the node does not change it while fills, sizes and effects
+    do."""
+    properties = {}
+    for key, value in node.items():
+        if key in RENDER_IGNORED_KEYS:
+            continue
+        if key in BOX_KEYS and value:
+            value = {
+                **value,
+                "x": value.get("x", 0) - origin.get("x", 0),
+                "y": value.get("y", 0) - origin.get("y", 0),
+            }
+        elif key == "relativeTransform" and root and value:
+            # Keep the rotation and scale, drop the translation
+            value = [row[:2] + [0] for row in value]
+        elif key == "children":
+            value = [render_properties(child, origin, False) for child in value]
+        properties[key] = value
+    return properties
+
+
+class RenderCache:
+    """Images rendered by the Figma images endpoint, stored under `path` by the
+    hash of the rendered node's subtree (see `render_properties`): a node that
+    did not change is never sent to be rendered again, even when it moved or
+    its image file got another name."""
+
+    def __init__(self, path: Path, max_entries: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, node: dict) -> str:
+        origin = node.get("absoluteBoundingBox") or {}
+        content = json.dumps(
+            render_properties(node, origin), sort_keys=True, separators=(",", ":")
+        )
+        return hashlib.sha1(content.encode("UTF-8")).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        path = self.path / f"{key}.png"
+        if not path.exists():
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(path)
+        return path.read_bytes()
+
+    def put(self, key: str, data: bytes):
+        self.path.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.path / f"{key}.png", data)
+
+    def evict(self):
+        """Deletes the least recently used renders beyond `max_entries`."""
+        if not self.path.exists():
+            return
+        renders = sorted(self.path.glob("*.png"), key=lambda p: p.stat().st_mtime)
+        for path in renders[: max(0, len(renders) - self.max_entries)]:
+            path.unlink()
+
+
+# Stand-in position of the elements generated for the cache
+POSITION = ("__left__", "__top__")
+POSITION_CODE = position_code(*POSITION)
+
+# Version of the code the element emitters generate: bump it whenever one of
+# them changes, so caches saved by an older figmaflet are not replayed
+CODE_VERSION = 2
+
+
+class ElementCache:
+    """Memo of generated element code keyed by the element's content.
+
+    Elements found in it are not made again either (see `CachedElement`):
+    only their position is computed, and their code is filled in with it.
+
+    Entries are kept in least-recently-used order and saved to `path`, so
+    unchanged elements are not generated again on the next run either.
+    """
+
+    def __init__(self, path: Path = None, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None and path.exists():
+            try:
+                saved = json_loads(path.read_bytes())
+            except ValueError:
+                print(f"Ignoring corrupted element cache {path}.")
+            else:
+                if isinstance(saved, dict) and saved.get("version") == CODE_VERSION:
+                    self.entries.update(saved["entries"])
+
+    def key(self, node: dict, kind: str) -> str:
+        # marshal is the fastest serializer; version 2 writes no back
+        # references, so equal content always gives equal bytes
+        box = node.get("absoluteBoundingBox") or {}
+        content = marshal.dumps(
+            [kind, box.get("width"), box.get("height"), strip_location(node)], 2
+        )
+        return hashlib.sha1(content).hexdigest()
+
+    def get(self, key: str) -> dict:
+        """Returns the entry of `key` (None if missing), as recently used."""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def to_code(self, element, styles) -> str:
+        """Returns the code of an element made by `Frame.create_element`:
+        replayed for a `CachedElement` or an element generated earlier in the
+        run, generated and stored otherwise."""
+        if isinstance(element, CachedElement):
+            entry = element.entry
+        else:
+            entry = self.get(element.cache_key)
+        if entry is not None:
+            self.hits += 1
+            code = self.replay(entry, styles)
+        else:
+            self.misses += 1
+            start = len(styles.log)
+            # Generated at a stand-in position, the element's is filled in below
+            x, y = element.x, element.y
+            element.x, element.y = POSITION
+            try:
+                code = element.to_code()
+            finally:
+                element.x, element.y = x, y
+            self.entries[element.cache_key] = {
+                "code": code,
+                "styles": styles.log[start:],
+            }
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return code.replace(POSITION_CODE, position_code(element.x, element.y))
+
+    def replay(self, entry, styles) -> str:
+        """Registers the entry's styles in `styles` and renames the constants
+        of its code to the names they have in this module, if any differs."""
+        names = {}
+        pattern = None
+
+        def rename(text):
+            return pattern.sub(lambda m: names.get(m.group(0), m.group(0)), text)
+
+        for kind, expression, name in entry["styles"]:
+            if pattern is not None:
+                expression = rename(expression)
+            names[name] = styles.add(kind, expression)
+            if names[name] != name and pattern is None:
+                pattern = re.compile(
+                    r"\b(" + "|".join(re.escape(s[2]) for s in entry["styles"]) + r")\b"
+                )
+        return entry["code"] if pattern is None else rename(entry["code"])
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(
+            self.path, json_dumps({"version": CODE_VERSION, "entries": self.entries})
+        )
@@ -1,7 +1,8 @@
+import os
 import re
+import time
 import argparse
 from pathlib import Path
-from figmaflet.generateUI import UI
 
 
 # def extract_file_key(url):
@@ -11,25 +12,418 @@ from figmaflet.generateUI import UI
 #     return None
 
 
+def densities(value: str) -> tuple:
+    """Parses --densities: screen densities from 1x to 4x (Figma's largest
+    render scale)."""
+    try:
+        parsed = tuple(sorted({int(density) for density in value.split(",")}))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid densities: {value}")
+    if not all(1 <= density <= 4 for density in parsed):
+        raise argparse.ArgumentTypeError("densities go from 1 to 4")
+    return parsed
+
+
+# Printed when images are exported for several densities
+DENSITY_NOTE = (
+    "Note: on Flet 0.x the generated app only loads the @2x/@3x images when "
+    "FIGMAFLET_PIXEL_RATIO is set (e.g. FIGMAFLET_PIXEL_RATIO=2 flet run); "
+    "Flet 1.0 reports the device pixel ratio itself."
+)
+
+
+def several_densities(manifest: dict) -> bool:
+    """Whether a file of a batch manifest exports images for several densities."""
+    return any(
+        len(entry.get("densities", manifest.get("densities", ()))) > 1
+        for entry in manifest["files"]
+    )
+
+
+def add_figma_arguments(parser, required=True):
+    parser.add_argument("--apitoken", required=required, help="Your Figma API token.")
+    parser.add_argument(
+        "--fileurl", required=required, help="The URL of the Figma file."
+    )
+    parser.add_argument(
+        "--output", required=required, help="Output file for the generated UI code."
+    )
+    parser.add_argument(
+        "--document",
+        help="Generate from a saved document (JSON or snapshot) instead of fetching it.",
+    )
+    parser.add_argument(
+        "--bundle-fonts",
+        action="store_true",
+        help="Download the fonts (subset to the used glyphs) into assets/.",
+    )
+    parser.add_argument(
+        "--bake-threshold",
+        type=int,
+        help="Export decorative groups with at least this many layers as one image.",
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="Write one module per frame and a lazy main.py instead of one file.",
+    )
+    parser.add_argument(
+        "--min-list-items",
+        type=int,
+        default=5,
+        help="Emit runs of this many repeated elements as a ListView (0 disables).",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from its checkpoint in the output folder.",
+    )
+    parser.add_argument(
+        "--densities",
+        type=densities,
+        default=(1,),
+        help="Export images for these screen densities, e.g. 1,2,3 (default: 1). "
+        "The app picks one from the device pixel ratio, which Flet only reports "
+        "from 1.0 on: the generated code targets Flet 0.x, where the extra files "
+        "are only loaded if FIGMAFLET_PIXEL_RATIO is set when the app runs.",
+    )
+    add_memory_argument(parser)
+    add_cache_arguments(parser)
+
+
+def add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("FIGMAFLET_CACHE_DIR"),
+        help="Cache shared by the figmaflet processes of this host "
+        "(default: $FIGMAFLET_CACHE_DIR).",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=1024,
+        help="Megabytes kept in the shared cache (default: 1024).",
+    )
+
+
+def add_memory_argument(parser):
+    parser.add_argument(
+        "--max-image-memory",
+        type=int,
+        help="Megabytes of decoded images held at once (default: no limit).",
+    )
+
+
+def add_budget_arguments(parser):
+    parser.add_argument(
+        "--max-startup-ms",
+        type=float,
+        help="Fail if the generated app takes longer to import and build.",
+    )
+    parser.add_argument(
+        "--max-controls",
+        type=int,
+        help="Fail if a generated screen has more Flet controls.",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        help="Fail if generated controls nest deeper.",
+    )
+    parser.add_argument(
+        "--max-module-kb",
+        type=float,
+        help="Fail if the generated modules are larger.",
+    )
+
+
+def check_budgets(args, local_path) -> bool:
+    """Measures the generated app when a budget is set. Returns False if it
+    is over one."""
+    from figmaflet.bench import BUDGETS, measure, over_budget, print_measure
+
+    budgets = {option: getattr(args, option) for option in BUDGETS}
+    if args.command != "bench" and all(v is None for v in budgets.values()):
+        return True
+
+    report = measure(local_path)
+    print_measure(report)
+    failures = over_budget(report, budgets)
+    for failure in failures:
+        print(f"Over budget: {failure}.")
+    return not failures
+
+
 def main():
     parser = argparse.ArgumentParser(description="Generate Flet UI from Figma designs.")
-    parser.add_argument("--apitoken", required=True, help="Your Figma API token.")
-    parser.add_argument("--fileurl", required=True, help="The URL of the Figma file.")
-    parser.add_argument(
-        "--output", required=True, help="Output file for the generated UI code."
+    add_figma_arguments(parser, required=False)
+    add_budget_arguments(parser)
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Regenerate the UI every time the Figma file changes."
+    )
+    add_figma_arguments(watch_parser)
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=5.0,
+        help="Seconds between two checks of the file version (default: 5).",
+    )
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Generate many Figma files listed in a manifest."
+    )
+    batch_parser.add_argument("manifest", help="Path to a YAML or JSON manifest.")
+    batch_parser.add_argument(
+        "--workers", type=int, help="Number of files generated in parallel."
+    )
+    batch_parser.add_argument(
+        "--rate", type=float, help="Maximum Figma API calls per second (all files)."
+    )
+    add_memory_argument(batch_parser)
+    add_cache_arguments(batch_parser)
+
+    plan_parser = subparsers.add_parser(
+        "plan", help="Estimate the cost of a generation without running it."
+    )
+    plan_parser.add_argument("--apitoken", help="Your Figma API token.")
+    plan_parser.add_argument("--fileurl", help="The URL of the Figma file.")
+    plan_parser.add_argument(
+        "--document", help="Plan from a saved document (JSON or snapshot)."
+    )
+    plan_parser.add_argument(
+        "--bake-threshold",
+        type=int,
+        help="Export decorative groups with at least this many layers as one image.",
+    )
+    plan_parser.add_argument(
+        "--min-list-items",
+        type=int,
+        default=5,
+        help="Emit runs of this many repeated elements as a ListView (0 disables).",
+    )
+    plan_parser.add_argument(
+        "--output",
+        help="Output folder of an earlier run: its cached renders are not counted.",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Regenerate the UI when a Figma webhook reports a change."
+    )
+    add_figma_arguments(serve_parser, required=False)
+    serve_parser.add_argument(
+        "--manifest", help="Serve every file of a batch manifest instead."
+    )
+    serve_parser.add_argument(
+        "--passcode",
+        default=os.environ.get("FIGMAFLET_WEBHOOK_PASSCODE"),
+        help="Passcode of the Figma webhook (default: $FIGMAFLET_WEBHOOK_PASSCODE).",
+    )
+    serve_parser.add_argument(
+        "--host", default="127.0.0.1", help="Address to listen on."
+    )
+    serve_parser.add_argument(
+        "--port", type=int, default=8765, help="Port to listen on (default: 8765)."
+    )
+    serve_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        help="Seconds without edits before regenerating (default: 2).",
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="Measure the startup cost of a generated app."
+    )
+    bench_parser.add_argument("path", help="Folder of the generated main.py.")
+    add_budget_arguments(bench_parser)
+
+    snapshot_parser = subparsers.add_parser(
+        "snapshot", help="Save the file as a compact snapshot to generate from later."
+    )
+    snapshot_parser.add_argument("path", help="Where to write the snapshot.")
+    snapshot_parser.add_argument("--apitoken", help="Your Figma API token.")
+    snapshot_parser.add_argument("--fileurl", help="The URL of the Figma file.")
+    snapshot_parser.add_argument(
+        "--document", help="Convert a saved file JSON instead of fetching it."
     )
 
     args = parser.parse_args()
 
-    ui = UI(
-        token=args.apitoken,
-        file_key=args.fileurl,
+    if getattr(args, "max_image_memory", None):
+        from figmaflet import utils
+
+        utils.image_memory.limit = args.max_image_memory * 2**20
+
+    if getattr(args, "cache_dir", None):
+        from figmaflet import shared_cache
+
+        shared_cache.configure(args.cache_dir, args.cache_size)
+
+    if len(getattr(args, "densities", ())) > 1:
+        print(DENSITY_NOTE)
+
+    if args.command == "serve":
+        from figmaflet.serve import serve
+
+        if not args.passcode:
+            serve_parser.error("--passcode is required")
+        if args.manifest:
+            from figmaflet.batch import load_manifest, make_ui
+
+            manifest = load_manifest(args.manifest)
+            if several_densities(manifest):
+                print(DENSITY_NOTE)
+            uis = {
+                entry["fileurl"]: make_ui(
+                    entry, entry.get("apitoken", manifest.get("apitoken")), manifest
+                )
+                for entry in manifest["files"]
+            }
+        elif args.apitoken and args.fileurl and args.output:
+            from figmaflet.generateUI import UI
+
+            uis = {
+                args.fileurl: UI(
+                    token=args.apitoken,
+                    file_key=args.fileurl,
+                    local_path=Path(args.output),
+                    bundle_fonts=args.bundle_fonts,
+                    bake_threshold=args.bake_threshold,
+                    split=args.split,
+                    min_list_items=args.min_list_items,
+                    resume=args.resume,
+                    densities=args.densities,
+                )
+            }
+        else:
+            serve_parser.error(
+                "either --manifest or --apitoken, --fileurl and --output needed"
+            )
+        try:
+            serve(uis, args.passcode, args.host, args.port, args.debounce)
+        except KeyboardInterrupt:
+            print("Stopped serving.")
+        return
+
+    if args.command == "bench":
+        if not check_budgets(args, Path(args.path)):
+            raise SystemExit(1)
+        return
+
+    if args.command == "snapshot":
+        from figmaflet.document import load_document, save_snapshot
+
+        if args.document:
+            file_data = load_document(args.document)
+        elif args.apitoken and args.fileurl:
+            from figmaflet.figma import endpoints
+
+            file_data = endpoints.Files(args.apitoken, args.fileurl).get_file()
+        else:
+            snapshot_parser.error(
+                "either --document or --apitoken and --fileurl needed"
+            )
+        save_snapshot(file_data, Path(args.path))
+        print(f"Snapshot of version {file_data.get('version')} saved to {args.path}.")
+        return
+
+    if args.command == "plan":
+        from figmaflet.plan import plan, print_plan
+        from figmaflet.document import load_document
+
+        if args.document:
+            file_data = load_document(args.document)
+        elif args.apitoken and args.fileurl:
+            from figmaflet.figma import endpoints
+
+            file_data = endpoints.Files(args.apitoken, args.fileurl).get_file()
+        else:
+            plan_parser.error("either --document or --apitoken and --fileurl needed")
+        render_cache = None
+        if args.output:
+            from figmaflet.cache import RenderCache
+
+            render_cache = RenderCache(Path(args.output) / ".figmaflet" / "renders")
+        print_plan(
+            plan(
+                file_data,
+                bake_threshold=args.bake_threshold,
+                min_list_items=args.min_list_items,
+                render_cache=render_cache,
+            )
+        )
+        return
+
+    if args.command == "batch":
+        from figmaflet.batch import load_manifest, run_batch, print_report
+
+        manifest = load_manifest(args.manifest)
+        if several_densities(manifest):
+            print(DENSITY_NOTE)
+        start = time.perf_counter()
+        results = run_batch(
+            manifest,
+            args.workers,
+            args.rate,
+            args.max_image_memory,
+        )
+        print_report(results, time.perf_counter() - start)
+        if any(r["error"] for r in results):
+            raise SystemExit(1)
+        return
+
+    if not (args.output and (args.document or (args.apitoken and args.fileurl))):
+        parser.error(
+            "the following arguments are required: --apitoken, --fileurl, --output"
+            " (or --document and --output)"
+        )
+
+    from figmaflet.generateUI import UI
+
+    options = dict(
         local_path=Path(args.output),
+        bundle_fonts=args.bundle_fonts,
+        bake_threshold=args.bake_threshold,
+        split=args.split,
+        min_list_items=args.min_list_items,
+        resume=args.resume,
+        densities=args.densities,
     )
+    if args.document:
+        ui = UI.from_document(
+            args.document, token=args.apitoken, file_key=args.fileurl, **options
+        )
+    else:
+        ui = UI(token=args.apitoken, file_key=args.fileurl, **options)
+
+    if args.command == "watch":
+        from figmaflet.watch import watch
+
+        try:
+            watch(ui, interval=args.interval)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+        return
+
     ui.generate()
 
+    print(ui.pruned_summary())
+    print(ui.write_summary())
+    stats = ui.element_cache.stats()
+    print(f"Element cache: {stats['hits']} hits, {stats['misses']} misses.")
+    if args.cache_dir:
+        from figmaflet import shared_cache
+
+        stats = shared_cache.cache.stats()
+        print(f"Shared cache: {stats['hits']} hits, {stats['misses']} misses.")
     print(f"UI code has been successfully generated and saved to {args.output}.")
 
+    if not check_budgets(args, Path(args.output)):
+        raise SystemExit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+"""Loading and saving Figma documents (the JSON of the files endpoint)."""
+
+import json
+import mmap
+import marshal
+from pathlib import Path
+from importlib.util import MAGIC_NUMBER
+from figmaflet.figma.prune import prune
+
+try:
+    import orjson
+except ImportError:  # optional: pip install figmaflet[fast]
+    orjson = None
+
+# marshal's format changes between Python versions: the interpreter's bytecode
+# magic number tells whether a snapshot can be read by this one
+SNAPSHOT_HEADER = b"FIGMAFLET-SNAPSHOT\x01" + MAGIC_NUMBER
+
+# Node data the generator never reads, left out of snapshots
+DROPPED_KEYS = (
+    "pluginData",
+    "sharedPluginData",
+    "exportSettings",
+    "interactions",
+    "reactions",
+    "prototypeInteractions",
+    "flowStartingPoints",
+    "prototypeDevice",
+)
+
+
+def json_loads(data):
+    """Parses JSON (str or bytes), with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("UTF-8")
+
+
+def strip_node(node: dict) -> dict:
+    node = {k: v for k, v in node.items() if k not in DROPPED_KEYS}
+    if "children" in node:
+        node["children"] = [strip_node(child) for child in node["children"]]
+    return node
+
+
+def save_snapshot(file_data: dict, path: Path):
+    """Saves the document in a compact binary form: hidden nodes are pruned
+    and data the generator doesn't use is left out."""
+    document = dict(file_data["document"])
+    document["children"] = [
+        {**canvas, "children": [strip_node(prune(f, [])) for f in canvas["children"]]}
+        for canvas in document["children"]
+    ]
+    snapshot = {
+        key: value
+        for key, value in file_data.items()
+        if key in ("name", "version", "lastModified")
+    }
+    snapshot["document"] = document
+
+    from figmaflet.utils import write_atomic
+
+    write_atomic(path, SNAPSHOT_HEADER + marshal.dumps(snapshot))
+
+
+def load_snapshot(path: Path) -> dict:
+    """Loads a snapshot through a memory map of the file (no read copy)."""
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[: len(SNAPSHOT_HEADER)] != SNAPSHOT_HEADER:
+                raise RuntimeError(
+                    f"{path} is not a snapshot of this Python version, save it again."
+                )
+            with memoryview(data) as view, view[len(SNAPSHOT_HEADER) :] as body:
+                return marshal.loads(body)
+
+
+def load_document(path: Path) -> dict:
+    """Loads a document saved as a snapshot or as the files endpoint's JSON."""
+    with open(path, "rb") as file:
+        is_snapshot = file.read(len(SNAPSHOT_HEADER) - len(MAGIC_NUMBER)) == (
+            SNAPSHOT_HEADER[: -len(MAGIC_NUMBER)]
+        )
+    if is_snapshot:
+        return load_snapshot(path)
+    return json_loads(Path(path).read_bytes())
@@ -0,0 +1,74 @@
+from pathlib import Path
+from .styles import StyleTable
+
+
+class Context:
+    """What the frames of a generated tree share: the run's options, caches
+    and the state they fill in. Made once per top-level frame (see
+    `UI.render_frame`) and handed down to every nested frame."""
+
+    def __init__(
+        self,
+        output_path: Path,
+        figma_file=None,
+        assets=None,
+        bake_threshold=None,
+        asset_prefix="",
+        element_cache=None,
+        outputs=None,
+        min_list_items=None,
+        image_urls=None,
+        placeholders=None,
+        render_cache=None,
+        densities=(1,),
+        image_queue=None,
+    ):
+        self.output_path = output_path
+        self.assets_path = output_path / "assets"
+        self.output_path.mkdir(parents=True, exist_ok=True)
+        self.assets_path.mkdir(parents=True, exist_ok=True)
+
+        # Renders images, None when generating from a saved document only
+        self.figma_file = figma_file
+
+        # image path -> digest of the node it was downloaded for (kept across
+        # runs in watch mode) to skip unchanged images
+        self.assets = {} if assets is None else assets
+
+        # Decorative subtrees with at least this many descendants are exported
+        # as a single image (None disables baking)
+        self.bake_threshold = bake_threshold
+
+        # Prepended to image file names, so screens don't overwrite each other
+        self.asset_prefix = asset_prefix
+
+        # Memo of element code (see `figmaflet.cache.ElementCache`), optional
+        self.element_cache = element_cache
+
+        # image path -> whether this run wrote it (False: unchanged, skipped)
+        self.outputs = {} if outputs is None else outputs
+
+        # Runs of at least this many repeated siblings become a ListView/GridView
+        self.min_list_items = min_list_items
+
+        # image render key -> render URL, kept so a resumed run doesn't ask again
+        self.image_urls = {} if image_urls is None else image_urls
+
+        # image path -> color and thumbnail shown while the image loads
+        self.placeholders = {} if placeholders is None else placeholders
+
+        # Earlier renders of image nodes (see `figmaflet.cache.RenderCache`)
+        self.render_cache = render_cache
+
+        # Screen densities every image is exported for (1 is always one)
+        self.densities = densities
+
+        # Images to download once the code is written (see `UI.download_images`),
+        # None to download them while the frames are built
+        self.image_queue = image_queue
+
+        # Style constants of the generated module
+        self.styles = StyleTable()
+
+        # Image numbers handed out, so nested frames don't reuse image names
+        self.counter = {}
@@ -1,10 +1,41 @@
-""" Utility classes and functions for Figma API endpoints.
-"""
+"""Utility classes and functions for Figma API endpoints."""
 
+import time
+import threading
 import requests
+from figmaflet.document import json_loads
 
 _token = "FIGMA-API"
 
+# One connection pool for every request made by this process, so batch runs and
+# watch mode don't pay a new TLS handshake per call.
+session = requests.Session()
+
+
+class RateLimiter:
+    """Spaces out Figma API calls so that at most `rate` of them start per second,
+    across every thread of the process. `rate=None` disables the limit."""
+
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.calls = 0
+        self._next_call = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            self.calls += 1
+            if not self.rate:
+                return
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + 1 / self.rate
+        if delay > 0:
+            time.sleep(delay)
+
+
+rate_limiter = RateLimiter()
+
 
 class Files:
     """https://www.figma.com/developers/api#files-endpoints"""
@@ -18,22 +49,47 @@ class Files:
     def __str__(self):
         return f"Files {{ Token: {self.token}, File: {self.file_key} }}"
 
+    def _get(self, path):
+        rate_limiter.wait()
+        response = session.get(
+            f"{self.API_ENDPOINT_URL}/{path}",
+            headers={"X-FIGMA-TOKEN": self.token},
+        )
+        if response.status_code != 200:
+            # Error bodies look like {"status": 429, "err": "Rate limit exceeded"}
+            try:
+                message = response.json().get("err")
+            except (ValueError, AttributeError):
+                message = None
+            raise RuntimeError(
+                f"Figma API error {response.status_code}"
+                + (f": {message}." if message else ".")
+            )
+        return response
+
     def get_file(self) -> dict:
         try:
-            response = requests.get(
-                f"{self.API_ENDPOINT_URL}/files/{self.file_key}",
-                headers={"X-FIGMA-TOKEN": self.token},
-            )
+            response = self._get(f"files/{self.file_key}")
         except ValueError:
             raise RuntimeError("Invalid Input. Please check your input and try again.")
         except requests.ConnectionError:
             raise RuntimeError("FigmaFlet requires internet access to work.")
         else:
-            return response.json()
+            return json_loads(response.content)
 
-    def get_image(self, item_id) -> str:
-        response = requests.get(
-            f"{self.API_ENDPOINT_URL}/images/{self.file_key}?ids={item_id}&scale=2",
-            headers={"X-FIGMA-TOKEN": self.token},
-        )
+    def get_version(self) -> str:
+        """Returns the current version id of the file.
+
+        Only the top level of the document is requested (`depth=1`), which makes
+        this cheap enough to poll.
+        """
+        try:
+            response = self._get(f"files/{self.file_key}?depth=1")
+        except requests.ConnectionError:
+            raise RuntimeError("FigmaFlet requires internet access to work.")
+        else:
+            return response.json().get("version")
+
+    def get_image(self, item_id, scale=2) -> str:
+        response = self._get(f"images/{self.file_key}?ids={item_id}&scale={scale}")
         return response.json()["images"][item_id]
@@ -1,14 +1,114 @@
 from .node import Node
-from .vector_elements import Rectangle, Text, TextField, Image, Button, UnknownElement
-from ..utils import download_image
+from .lists import find_runs, extract_template
+from .vector_elements import (
+    Rectangle,
+    Text,
+    TextField,
+    Image,
+    Button,
+    UnknownElement,
+    Spacer,
+    CachedElement,
+    position_code,
+)
+from ..utils import (
+    density_path,
+    download_image,
+    render_scale,
+    read_placeholder,
+    node_digest,
+    write_if_changed,
+)
+from ..shared_cache import cached
 from pathlib import Path
 
+# Figma auto layout alignments -> Flet MainAxisAlignment / CrossAxisAlignment
+MAIN_AXIS_ALIGNMENT = {
+    "MIN": "START",
+    "CENTER": "CENTER",
+    "MAX": "END",
+    "SPACE_BETWEEN": "SPACE_BETWEEN",
+}
+CROSS_AXIS_ALIGNMENT = {"MIN": "START", "CENTER": "CENTER", "MAX": "END"}
+
+# Element kinds whose code is memoized by the element cache, and their classes
+CACHED_KINDS = {
+    "button": Button,
+    "textfield": TextField,
+    "rectangle": Rectangle,
+    "text": Text,
+    "spacer": Spacer,
+    "unknown": UnknownElement,
+}
+
+
+def element_kind(element, bake_threshold=None) -> str:
+    """Returns which element `Frame.create_element` makes of a node: "button",
+    "textfield", "baked", "frame", "image", "rectangle", "text", "spacer" or
+    "unknown"."""
+    element_name = element["name"].strip().lower()
+    element_type = element["type"].strip().lower()
+
+    if element_type == "frame" and "button" in element_name:
+        return "button"
+    if element_type == "frame" and "textfield" in element_name:
+        return "textfield"
+    if element_type in ("frame", "group"):
+        return "baked" if is_bakeable(element, bake_threshold) else "frame"
+
+    if element_type == "spacer":
+        return "spacer"
+
+    fills = element.get("fills", [])
+    if fills and fills[0].get("type") == "IMAGE":
+        return "image"
+    if element_name == "rectangle" or element_type == "rectangle":
+        return "rectangle"
+    if element_type == "text":
+        return "text"
+    return "unknown"
+
+
+def is_bakeable(element, bake_threshold) -> bool:
+    """Whether `element` is a non-interactive subtree with at least
+    `bake_threshold` descendants, worth rendering as one image."""
+    if not bake_threshold:
+        return False
+
+    count = 0
+    stack = list(element.get("children", []))
+    while stack:
+        child = stack.pop()
+        child_name = child["name"].strip().lower()
+        if child["type"] == "FRAME" and (
+            "button" in child_name or "textfield" in child_name
+        ):
+            return False
+        count += 1
+        stack.extend(child.get("children", []))
+    return count >= bake_threshold
+
+
+def is_auto_layout(node) -> bool:
+    """Whether a frame can be emitted as a Row/Column: it uses auto layout and
+    none of its children is absolutely positioned or overlaps."""
+    if node.get("layoutMode") not in ("HORIZONTAL", "VERTICAL"):
+        return False
+    if node.get("itemSpacing", 0) < 0:
+        return False
+    return not any(
+        child.get("layoutPositioning") == "ABSOLUTE"
+        for child in node.get("children", [])
+    )
+
 
 class Frame(Node):
-    def __init__(self, node, output_path, figma_file, parent=None):
+    def __init__(self, node, context, parent=None):
         super().__init__(node)
 
         self.parent = parent
+        # Options and state shared by the whole tree (see `Context`)
+        self.context = context
 
         self.width, self.height = self.size()
         self.x, self.y = self.position()
@@ -17,26 +117,35 @@ class Frame(Node):
         self.border_radius = self.get_border_radius()
         self.shadow = self.get_shadow()
 
-        self.counter = {}
-
-        self.figma_file = figma_file
-
-        self.output_path: Path = output_path
-        self.assets_path: Path = output_path / "assets"
-
-        self.output_path.mkdir(parents=True, exist_ok=True)
-        self.assets_path.mkdir(parents=True, exist_ok=True)
-
         self.elements = [
             self.create_element(child) for child in self.children if Node(child).visible
         ]
 
+        # Children of an auto layout frame are placed by its Row/Column
+        if self.is_auto_layout():
+            for element in self.elements:
+                element.x = element.y = None
+
     def create_element(self, element):
+        kind = element_kind(element, self.context.bake_threshold)
+        cache = self.context.element_cache
+        if cache is None or kind not in CACHED_KINDS:
+            return self.make_element(element, kind)
+
+        # Generated by an earlier run: placed, but neither made nor generated
+        key = cache.key(element, kind)
+        entry = cache.get(key)
+        if entry is not None:
+            return CachedElement(element, self, entry, CACHED_KINDS[kind])
+        made = self.make_element(element, kind)
+        made.cache_key = key
+        return made
+
+    def make_element(self, element, kind):
         element_name = element["name"].strip().lower()
-        element_type = element["type"].strip().lower()
 
         # Handle Button detection
-        if element_type == "frame" and "button" in element_name:
+        if kind == "button":
             button_text = ""
             button_icon = None
             text_color = "#ffffff"
@@ -54,7 +163,7 @@ class Frame(Node):
             return Button(element, self, text=button_text, text_color=text_color)
 
         # Handle TextField detection based on frame and text
-        if element_type == "frame" and "textfield" in element_name:
+        if kind == "textfield":
             hint_text = ""
             label_text = ""
 
@@ -77,43 +186,283 @@ class Frame(Node):
                 label_text=label_text,
                 is_password=is_password,
             )
-        if element_type == "frame" or element_type == "group":
-            return Frame(
-                element,
-                figma_file=self.figma_file,
-                output_path=self.output_path,
-                parent=self,
-            )
+        if kind == "baked":
+            return self.handle_image_element(element)
+
+        if kind == "frame":
+            return Frame(element, self.context, parent=self)
         # elif element_name == "textfield":
         #     return TextField(element, self)
 
-        fills = element.get("fills", [])
-        if fills and fills[0].get("type") == "IMAGE":
+        if kind == "image":
             return self.handle_image_element(element)
 
-        if element_name == "rectangle" or element_type == "rectangle":
+        if kind == "rectangle":
             return Rectangle(element, self)
-        elif element_type == "text":
+        elif kind == "text":
             return Text(element, self)
+        elif kind == "spacer":
+            return Spacer(element, self)
 
         else:
             return UnknownElement(element, self)
 
     def handle_image_element(self, element):
-        self.counter[Image] = self.counter.get(Image, 0) + 1
-        item_id = element["id"]
-        image_url = self.figma_file.get_image(item_id)
-        image_path = self.assets_path / f"image_{self.counter[Image]}.png"
-        download_image(image_url, image_path)
-
-        image_path = image_path.relative_to(self.assets_path)
+        context = self.context
+        context.counter[Image] = context.counter.get(Image, 0) + 1
+        image_path = (
+            context.assets_path
+            / f"{context.asset_prefix}image_{context.counter[Image]}.png"
+        )
+
+        digest = node_digest(element)
+        paths = [str(density_path(image_path, d)) for d in context.densities]
+        pending = False
+        if any(context.assets.get(p) != digest or not Path(p).exists() for p in paths):
+            if context.image_queue is None:
+                context.outputs.update(self.fetch_image(element, image_path, digest))
+            else:
+                # Written as an empty box until it is downloaded
+                pending = True
+                context.image_queue.append(
+                    {
+                        "frame": self,
+                        "element": element,
+                        "path": image_path,
+                        "digest": digest,
+                    }
+                )
+                context.outputs.update((path, False) for path in paths)
+                context.placeholders.pop(str(image_path), None)
+        else:
+            context.outputs.update((path, False) for path in paths)
+            if str(image_path) not in context.placeholders:
+                # Downloaded before placeholders were recorded
+                context.placeholders[str(image_path)] = read_placeholder(image_path)
+
+        placeholder = context.placeholders.get(str(image_path))
+        image_path = image_path.relative_to(context.assets_path)
+
+        return Image(
+            element,
+            self,
+            image_path,
+            id_=f"{context.counter[Image]}",
+            placeholder=placeholder,
+            variants=len(context.densities) > 1,
+            pending=pending,
+        )
+
+    def fetch_image(self, element, image_path, digest) -> dict:
+        """Downloads an image and its density variants. Returns {path: whether
+        the file was written}."""
+        written = self.save_image(element, image_path)
+        outputs = {}
+        for density in self.context.densities:
+            path = str(density_path(image_path, density))
+            outputs[path] = written[density]
+            self.context.assets[path] = digest
+        return outputs
+
+    def save_image(self, element, image_path) -> dict:
+        """Writes the render of a node to `image_path`, and its other density
+        variants next to it. Renders are reused from the render cache (this
+        output's earlier runs) or the host's shared cache before asking Figma,
+        which renders every variant at once. Returns {density: whether the
+        file was written}."""
+        context = self.context
+        key = (
+            context.render_cache.key(element)
+            if context.render_cache is not None
+            else node_digest(element)
+        )
+        scale = render_scale(context.densities)
+        downloads = {}
+
+        def download() -> None:
+            url_key = f"{key}@{scale}x"
+            if url_key not in context.image_urls:
+                if context.figma_file is None:
+                    raise RuntimeError(
+                        "Rendering images needs the Figma file: pass --apitoken and --fileurl."
+                    )
+                # Not shared with other processes: Figma expires render URLs,
+                # the shared cache keeps the images themselves instead
+                context.image_urls[url_key] = context.figma_file.get_image(
+                    element["id"], scale
+                )
+            try:
+                downloads.update(
+                    download_image(
+                        context.image_urls[url_key],
+                        image_path,
+                        context.placeholders,
+                        context.densities,
+                        scale,
+                    )
+                )
+            except RuntimeError:
+                # Likely expired: the next attempt asks Figma for a new URL
+                del context.image_urls[url_key]
+                raise
+
+        def variant(density):
+            def produce() -> bytes:
+                if not downloads:
+                    download()
+                return density_path(image_path, density).read_bytes()
+
+            return produce
+
+        written = {}
+        for density in context.densities:
+            variant_key = key if density == 1 else f"{key}@{density}x"
+            data = (
+                context.render_cache.get(variant_key)
+                if context.render_cache is not None
+                else None
+            )
+            if data is None:
+                data = cached(f"image:{variant_key}", variant(density))
+                if context.render_cache is not None:
+                    context.render_cache.put(variant_key, data)
+            if density not in downloads:
+                written[density] = write_if_changed(
+                    density_path(image_path, density), data
+                )
+        if downloads:
+            # Variants written before the download was needed were current
+            return {d: written.get(d, False) or downloads[d] for d in context.densities}
+        context.placeholders[str(image_path)] = read_placeholder(image_path)
+        return written
+
+    def element_code(self, element) -> str:
+        # Frames are made of cached elements already, images download files
+        if self.context.element_cache is None or isinstance(element, (Frame, Image)):
+            return element.to_code()
+        return self.context.element_cache.to_code(element, self.context.styles)
+
+    def children_code(self) -> str:
+        """Returns the code of all child elements, with the runs of repeated
+        siblings emitted as virtualized lists."""
+        runs = []
+        if self.context.min_list_items and not self.is_auto_layout():
+            runs = find_runs(self.elements, self.context.min_list_items)
+
+        codes = []
+        done = 0
+        for start, end, layout in runs:
+            codes += [self.element_code(child) for child in self.elements[done:start]]
+            list_code = self.list_code(self.elements[start:end], layout)
+            if list_code is None:
+                codes += [
+                    self.element_code(child) for child in self.elements[start:end]
+                ]
+            else:
+                codes.append(list_code)
+            done = end
+        codes += [self.element_code(child) for child in self.elements[done:]]
+        return ",\n".join(codes)
+
+    def list_code(self, items, layout):
+        """Returns a ListView/GridView built from a data list and an item builder
+        (both module constants), or None when the items differ by more than
+        their literal values."""
+        positions = [(item.x, item.y) for item in items]
+        (x, y), (last_x, last_y) = positions[0], positions[-1]
+        for item in items:
+            item.x = item.y = None
+
+        template = extract_template([self.element_code(item) for item in items])
+        if template is None:
+            for item, (item_x, item_y) in zip(items, positions):
+                item.x, item.y = item_x, item_y
+            return None
+
+        code, rows = template
+        params = ", ".join(f"p{i}" for i in range(len(rows[0])))
+        builder = self.context.styles.add(
+            "ITEM", f"lambda {params}: {code}" if params else f"lambda: {code}"
+        )
+        if params:
+            data = ", ".join(f"({', '.join(row)},)" for row in rows)
+            controls = f"[{builder}(*item) for item in {self.context.styles.add('ITEMS', f'[{data}]')}]"
+        else:
+            controls = f"[{builder}() for _ in range({len(rows)})]"
+
+        # Sized to what the frame shows, so that only visible items are built
+        width, height = items[0].width, items[0].height
+        if layout["kind"] == "vertical":
+            list_width = width
+            list_height = max(min(last_y + height - y, self.height - y), height)
+            options = f"spacing={layout['stride'] - height}, item_extent={height},"
+        elif layout["kind"] == "horizontal":
+            list_width = max(min(last_x + width - x, self.width - x), width)
+            list_height = height
+            options = f"spacing={layout['stride'] - width}, item_extent={width}, horizontal=True,"
+        else:
+            columns = layout["columns"]
+            list_width = columns * layout["stride"] - (layout["stride"] - width)
+            list_height = max(min(last_y + height - y, self.height - y), height)
+            options = (
+                f"runs_count={columns}, child_aspect_ratio={width / height}, "
+                f"spacing={layout['run_stride'] - height}, run_spacing={layout['stride'] - width},"
+            )
 
-        return Image(element, self, image_path, id_=f"{self.counter[Image]}")
+        return f"""
+        ft.{"GridView" if layout["kind"] == "grid" else "ListView"}(
+            controls={controls},
+            {position_code(x, y)}
+            width={list_width},
+            height={list_height},
+            {options}
+            )
+        """
 
     @property
     def children(self):
         return self.node.get("children")
 
+    def is_auto_layout(self) -> bool:
+        return is_auto_layout(self.node)
+
+    def layout_code(self, children_code) -> str:
+        """Returns the Row/Column laying out the children of an auto layout frame."""
+        horizontal = self.node["layoutMode"] == "HORIZONTAL"
+        main_alignment = MAIN_AXIS_ALIGNMENT.get(
+            self.node.get("primaryAxisAlignItems", "MIN"), "START"
+        )
+        cross_alignment = CROSS_AXIS_ALIGNMENT.get(
+            self.node.get("counterAxisAlignItems", "MIN"), "START"
+        )
+        spacing = self.node.get("itemSpacing", 0)
+        if main_alignment == "SPACE_BETWEEN":
+            spacing = 0
+
+        wrap_str = ""
+        if horizontal and self.node.get("layoutWrap") == "WRAP":
+            wrap_str = (
+                f"wrap=True, run_spacing={self.node.get('counterAxisSpacing', 0)},"
+            )
+
+        return f"""{"ft.Row" if horizontal else "ft.Column"}([
+                    {children_code},
+                ],
+                spacing={spacing},
+                alignment=ft.MainAxisAlignment.{main_alignment},
+                {"vertical_alignment" if horizontal else "horizontal_alignment"}=ft.CrossAxisAlignment.{cross_alignment},
+                {wrap_str})"""
+
+    def padding_code(self) -> str:
+        padding = [
+            self.node.get(f"padding{side}", 0)
+            for side in ("Left", "Top", "Right", "Bottom")
+        ]
+        if not any(padding):
+            return ""
+        left, top, right, bottom = padding
+        return f"padding=ft.padding.only(left={left}, top={top}, right={right}, bottom={bottom}),"
+
     def color(self) -> str:
         """Returns HEX form of element RGB color (str)"""
         try:
@@ -196,30 +545,35 @@ class Frame(Node):
         shadow_str = ""
         if self.shadow:
             shadow = self.shadow
-            shadow_str = f"""
-            shadow=ft.BoxShadow(
-                spread_radius={shadow["spread"]},
-                blur_radius={shadow["blur"]//5},
-                offset=ft.Offset({shadow["offset_x"]}, {shadow["offset_y"]}),
-                color="{shadow["color"]}"
-            ),
-            """
+            shadow_name = self.context.styles.add(
+                "SHADOW",
+                f"ft.BoxShadow(spread_radius={shadow['spread']}, blur_radius={shadow['blur']//5}, "
+                f"offset=ft.Offset({shadow['offset_x']}, {shadow['offset_y']}), "
+                f"color='{shadow['color']}')",
+            )
+            shadow_str = f"shadow={shadow_name},"
 
         # Generate code for all child elements
-        children_code = ",\n".join(child.to_code() for child in self.elements)
+        children_code = self.children_code()
         if children_code:
+            if self.is_auto_layout():
+                padding_str = self.padding_code()
+                content = self.layout_code(children_code)
+            else:
+                padding_str = ""
+                content = f"""ft.Stack([
+                    {children_code},
+                ])"""
             return f"""
             ft.Container(
-                left={self.x}, 
-                top={self.y},
+                {position_code(self.x, self.y)}
                 width={self.width},
                 height={self.height},
                 border_radius={self.border_radius},
                 {shadow_str}
+                {padding_str}
                 bgcolor="{self.bg_color}",
-                content=ft.Stack([
-                    {children_code},
-                ])
+                content={content}
             )
         """
         else:
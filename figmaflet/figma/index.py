@@ -0,0 +1,71 @@
+class NodeIndex:
+    """Lookup tables over a document, built in a single walk.
+
+    Nodes are the dicts of the files endpoint. Besides the id, every node is
+    filed under its type, its top-level frame, the component it instantiates
+    and the images it is filled with.
+    """
+
+    def __init__(self, document: dict):
+        self.nodes = {}  # id -> node
+        self.parents = {}  # id -> parent node
+        self.top = {}  # id -> id of the top-level frame holding the node
+        self.types = {}  # (top-level frame id or None, type) -> nodes
+        self.instances = {}  # componentId -> instance nodes
+        self.image_refs = {}  # imageRef -> nodes
+
+        # Canvases are the document's children, top-level frames theirs
+        stack = [(document, None, None, 0)]
+        while stack:
+            node, parent, top, depth = stack.pop()
+            node_id = node.get("id")
+            if depth == 2:
+                top = node_id
+            if node_id is not None:
+                self.nodes[node_id] = node
+                self.parents[node_id] = parent
+                self.top[node_id] = top
+
+            node_type = node.get("type")
+            self.types.setdefault((None, node_type), []).append(node)
+            if top is not None:
+                self.types.setdefault((top, node_type), []).append(node)
+            if node_type == "INSTANCE" and "componentId" in node:
+                self.instances.setdefault(node["componentId"], []).append(node)
+            for fill in node.get("fills", []):
+                if fill.get("type") == "IMAGE" and fill.get("imageRef"):
+                    self.image_refs.setdefault(fill["imageRef"], []).append(node)
+
+            # Reversed, so nodes are popped (and listed) in document order
+            for child in reversed(node.get("children", [])):
+                stack.append((child, node, top, depth + 1))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, node_id: str) -> dict:
+        return self.nodes.get(node_id)
+
+    def parent(self, node_id: str) -> dict:
+        return self.parents.get(node_id)
+
+    def ancestors(self, node_id: str):
+        """Yields the parents of a node, from the closest one up."""
+        parent = self.parents.get(node_id)
+        while parent is not None and parent.get("id") is not None:
+            yield parent
+            parent = self.parents.get(parent["id"])
+
+    def of_type(self, node_type: str, frame_id: str = None) -> list:
+        """Nodes of a type, in the whole document or in one top-level frame."""
+        return self.types.get((frame_id, node_type), [])
+
+    def instances_of(self, component_id: str) -> list:
+        return self.instances.get(component_id, [])
+
+    def component_of(self, instance: dict) -> dict:
+        """The component node an instance refers to, if it is in the file."""
+        return self.nodes.get(instance.get("componentId"))
+
+    def with_image(self, image_ref: str) -> list:
+        return self.image_refs.get(image_ref, [])
@@ -0,0 +1,141 @@
+"""Detection of repeated siblings (feeds, tables, product grids) that can be
+emitted as one virtualized ft.ListView / ft.GridView instead of N controls.
+"""
+
+import io
+import tokenize
+
+# Positions may be off by a rounding pixel between two items of a list
+TOLERANCE = 1
+
+
+def is_regular(values) -> bool:
+    """Whether `values` are evenly spaced (and increasing)."""
+    steps = [b - a for a, b in zip(values, values[1:])]
+    return steps[0] > 0 and all(abs(step - steps[0]) <= TOLERANCE for step in steps)
+
+
+def run_layout(elements):
+    """Returns how `elements` (same type and size) are laid out: a dict with
+    the list `kind` ("vertical", "horizontal" or "grid"), its `stride` and, for
+    grids, the number of `columns` and the `run_stride`; or None when they
+    are not regularly placed."""
+    xs = [element.x for element in elements]
+    ys = [element.y for element in elements]
+
+    if all(abs(x - xs[0]) <= TOLERANCE for x in xs) and is_regular(ys):
+        return {"kind": "vertical", "stride": ys[1] - ys[0]}
+    if all(abs(y - ys[0]) <= TOLERANCE for y in ys) and is_regular(xs):
+        return {"kind": "horizontal", "stride": xs[1] - xs[0]}
+
+    # Grid: the first row gives the columns, every row starts on a new line
+    columns = 1
+    while columns < len(xs) and abs(ys[columns] - ys[0]) <= TOLERANCE:
+        columns += 1
+    if columns < 2 or columns == len(xs) or not is_regular(xs[:columns]):
+        return None
+    rows = [ys[i] for i in range(0, len(ys), columns)]
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        if abs(x - xs[i % columns]) > TOLERANCE:
+            return None
+        if abs(y - rows[i // columns]) > TOLERANCE:
+            return None
+    if len(rows) < 2 or not is_regular(rows):
+        return None
+    return {
+        "kind": "grid",
+        "stride": xs[1] - xs[0],
+        "columns": columns,
+        "run_stride": rows[1] - rows[0],
+    }
+
+
+def fits(layout: dict, item) -> bool:
+    """Whether the items don't overlap: ListView/GridView can only add spacing."""
+    if layout["kind"] == "vertical":
+        return layout["stride"] >= item.height
+    return layout["stride"] >= item.width and (
+        layout.get("run_stride", item.height) >= item.height
+    )
+
+
+def element_type(element):
+    """The class of an element, or of the one a `CachedElement` stands for."""
+    return getattr(element, "element_type", type(element))
+
+
+def find_runs(elements, min_items: int):
+    """Yields (start, end, layout) for every run of at least `min_items`
+    consecutive elements of the same type and size placed at a regular stride."""
+    start = 0
+    while start < len(elements):
+        first = elements[start]
+        end = start + 1
+        while end < len(elements) and (
+            element_type(elements[end]) is element_type(first)
+            and elements[end].width == first.width
+            and elements[end].height == first.height
+        ):
+            end += 1
+
+        if end - start >= min_items and first.x is not None:
+            layout = run_layout(elements[start:end])
+            if layout is not None and fits(layout, first):
+                yield start, end, layout
+        start = end
+
+
+def significant_tokens(code: str):
+    return [
+        token
+        for token in tokenize.generate_tokens(io.StringIO(code).readline)
+        if token.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.ENDMARKER)
+    ]
+
+
+def extract_template(codes: list):
+    """Compares the code of structurally identical items.
+
+    Returns (template, rows): `template` is the code of the first item with the
+    literals that vary between items replaced by `p0`, `p1`...; `rows` holds
+    those literals for every item. Returns None when the items differ by more
+    than literal values.
+    """
+    # Parenthesized, so that multi-line element code tokenizes as one expression
+    codes = [f"({code})" for code in codes]
+    try:
+        tokens = [significant_tokens(code) for code in codes]
+    except (tokenize.TokenError, IndentationError):
+        return None
+    if any(len(t) != len(tokens[0]) for t in tokens):
+        return None
+
+    varying = []
+    for i, token in enumerate(tokens[0]):
+        others = [t[i] for t in tokens[1:]]
+        if any(other.type != token.type for other in others):
+            return None
+        if all(other.string == token.string for other in others):
+            continue
+        if token.type not in (tokenize.STRING, tokenize.NUMBER):
+            return None
+        varying.append(i)
+
+    # Replace the varying literals of the first item, last one first
+    lines = codes[0].splitlines(keepends=True)
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+
+    template = codes[0]
+    for param, i in reversed(list(enumerate(varying))):
+        (start_row, start_col), (end_row, end_col) = (
+            tokens[0][i].start,
+            tokens[0][i].end,
+        )
+        start = line_offsets[start_row - 1] + start_col
+        end = line_offsets[end_row - 1] + end_col
+        template = f"{template[:start]}p{param}{template[end:]}"
+
+    rows = [[t[i].string for i in varying] for t in tokens]
+    return template, rows
@@ -46,9 +46,8 @@ class Canvas(Node):
         super().__init__(node)
 
     @property
-    def children(self):
-        # TODO: Convert nodes to Node objects before returning a list of them.
-        return self.node.get("children")
+    def children(self) -> list[Node]:
+        return [Node(child) for child in self.node.get("children", [])]
 
     @property
     def background_color(self):
@@ -0,0 +1,157 @@
+"""Removes the nodes that can't be seen before any element is created, so
+they are neither emitted nor downloaded.
+"""
+
+
+def get_bounds(node: dict):
+    # Render bounds include shadows and strokes, fall back to the layout box
+    return node.get("absoluteRenderBounds") or node.get("absoluteBoundingBox")
+
+
+def intersects(a: dict, b: dict) -> bool:
+    return (
+        a["x"] < b["x"] + b["width"]
+        and b["x"] < a["x"] + a["width"]
+        and a["y"] < b["y"] + b["height"]
+        and b["y"] < a["y"] + a["height"]
+    )
+
+
+def contains(a: dict, b: dict) -> bool:
+    return (
+        a["x"] <= b["x"]
+        and a["y"] <= b["y"]
+        and b["x"] + b["width"] <= a["x"] + a["width"]
+        and b["y"] + b["height"] <= a["y"] + a["height"]
+    )
+
+
+def intersection(a: dict, b: dict) -> dict:
+    x, y = max(a["x"], b["x"]), max(a["y"], b["y"])
+    right = min(a["x"] + a["width"], b["x"] + b["width"])
+    bottom = min(a["y"] + a["height"], b["y"] + b["height"])
+    return {"x": x, "y": y, "width": max(right - x, 0), "height": max(bottom - y, 0)}
+
+
+# Nodes whose fills paint their whole box: a TEXT fill colors the glyphs only,
+# an ELLIPSE or VECTOR fill its shape only
+BOX_TYPES = ("RECTANGLE", "FRAME", "COMPONENT", "INSTANCE")
+BLUR_EFFECTS = ("LAYER_BLUR", "BACKGROUND_BLUR")
+
+
+def is_rotated(node: dict) -> bool:
+    # The bounding box of a rotated node is the axis-aligned hull of its shape
+    transform = node.get("relativeTransform")
+    if transform and (transform[0][1] or transform[1][0]):
+        return True
+    return bool(node.get("rotation"))
+
+
+def is_opaque(node: dict) -> bool:
+    """Whether the node paints every pixel of its bounding box."""
+    if not node.get("visible", True) or node.get("opacity", 1) < 1:
+        return False
+    if node.get("type") not in BOX_TYPES or is_rotated(node):
+        return False
+    if any(
+        effect.get("type") in BLUR_EFFECTS and effect.get("visible", True)
+        for effect in node.get("effects") or []
+    ):
+        return False
+    if node.get("cornerRadius") or any(node.get("rectangleCornerRadii") or []):
+        return False
+    if node.get("blendMode", "PASS_THROUGH") not in ("PASS_THROUGH", "NORMAL"):
+        return False
+
+    fills = [fill for fill in node.get("fills", []) if fill.get("visible", True)]
+    return bool(fills) and all(
+        fill.get("type") == "SOLID"
+        and fill.get("opacity", 1) == 1
+        and fill.get("color", {}).get("a", 1) == 1
+        for fill in fills
+    )
+
+
+# Layout properties a spacer keeps from the child it stands for
+FLOW_KEYS = (
+    "layoutAlign",
+    "layoutGrow",
+    "layoutSizingHorizontal",
+    "layoutSizingVertical",
+)
+
+
+def in_flow(parent: dict, child: dict) -> bool:
+    """Whether auto layout places `child`: it takes up room even unseen."""
+    return (
+        parent.get("layoutMode") in ("HORIZONTAL", "VERTICAL")
+        and child.get("layoutPositioning") != "ABSOLUTE"
+    )
+
+
+def spacer(node: dict) -> dict:
+    """An empty node of the size of `node`, keeping its place in the flow."""
+    return {
+        "id": node.get("id"),
+        "name": node.get("name", ""),
+        "type": "SPACER",
+        "absoluteBoundingBox": node.get("absoluteBoundingBox"),
+        **{key: node[key] for key in FLOW_KEYS if key in node},
+    }
+
+
+def hidden_reason(node: dict, covers: list, clip=None):
+    """Returns why `node` can't be seen, or None if it may be visible.
+
+    `covers` are the bounding boxes of the opaque siblings drawn above it.
+    """
+    if not node.get("visible", True):
+        return "invisible"
+    if node.get("opacity", 1) == 0:
+        return "zero opacity"
+
+    bounds = get_bounds(node)
+    if bounds is None:
+        return None
+    if clip is not None and not intersects(bounds, clip):
+        return "clipped"
+    if any(contains(cover, bounds) for cover in covers):
+        return "occluded"
+    return None
+
+
+def prune(node: dict, removed: list, clip=None) -> dict:
+    """Returns a copy of `node` without the descendants that can't be seen.
+
+    Each removed subtree is appended to `removed` as a dict with its
+    `id`, `name` and the `reason` it was removed.
+    """
+    children = node.get("children")
+    if not children:
+        return node
+
+    bbox = node.get("absoluteBoundingBox")
+    if node.get("clipsContent") and bbox:
+        clip = bbox if clip is None else intersection(clip, bbox)
+
+    # Children are listed bottom to top: walk them from the top one down, so
+    # `covers` always holds the opaque boxes drawn above the current child.
+    kept = []
+    covers = []
+    for child in reversed(children):
+        reason = hidden_reason(child, covers, clip)
+        if reason:
+            removed.append(
+                {"id": child.get("id"), "name": child.get("name"), "reason": reason}
+            )
+            # Hidden nodes leave the flow, transparent or covered ones don't
+            if reason != "invisible" and in_flow(node, child):
+                kept.append(spacer(child))
+            continue
+
+        kept.append(prune(child, removed, clip))
+        if is_opaque(child) and child.get("absoluteBoundingBox"):
+            covers.append(child["absoluteBoundingBox"])
+
+    kept.reverse()
+    return {**node, "children": kept}
@@ -0,0 +1,30 @@
+class StyleTable:
+    """Module-level constants shared by the elements of the generated code.
+
+    Paints, gradients, shadows and text styles are registered here instead of
+    being inlined in every control, so each distinct style is written (and
+    evaluated when the app starts) only once.
+    """
+
+    def __init__(self):
+        self.constants = {}  # expression -> constant name
+        self.counter = {}
+        # Every (kind, expression, name) handed out, in order (see ElementCache)
+        self.log = []
+
+    def add(self, kind: str, expression: str) -> str:
+        """Returns the name of the constant holding `expression`."""
+        if expression not in self.constants:
+            self.counter[kind] = self.counter.get(kind, 0) + 1
+            self.constants[expression] = f"{kind}_{self.counter[kind]}"
+        self.log.append((kind, expression, self.constants[expression]))
+        return self.constants[expression]
+
+    def color(self, opacity, hex_color: str) -> str:
+        """Returns a color expression; only translucent colors need a constant."""
+        if opacity == 1:
+            return f"'{hex_color}'"
+        return self.add("COLOR", f"ft.Colors.with_opacity({opacity}, '{hex_color}')")
+
+    def to_code(self) -> str:
+        return "\n".join(f"{name} = {expr}" for expr, name in self.constants.items())
@@ -1,6 +1,14 @@
 from .node import Node
 
 
+def position_code(x, y) -> str:
+    """Returns the `left`/`top` arguments of a control placed in a Stack, or
+    nothing when the control is placed by an auto layout Row/Column."""
+    if x is None:
+        return ""
+    return f"left={x}, top={y},"
+
+
 class Vector(Node):
     def __init__(self, node: dict) -> None:
         super().__init__(node)
@@ -59,15 +67,13 @@ class Vector(Node):
 class Rectangle(Vector):
     def __init__(self, node, frame):
         super().__init__(node)
+        self.styles = frame.context.styles
         self.x, self.y = self.position(frame)
         self.width, self.height = self.size()
         self.opacity, self.bg_color = self.color()
         self.gradient = None
-        self.border_str = ""
         self.border_width = int(self.node.get("strokeWeight", 2.0))
-        if self.strockes_color():
-            self.border_opacity, self.border_color = self.strockes_color()
-            self.border_str = f"border=ft.border.all({self.border_width},ft.Colors.with_opacity({self.border_opacity},'{self.border_color}')),"
+        self.stroke = self.strockes_color()
 
     def get_effects(self) -> dict:
 
@@ -93,7 +99,10 @@ class Rectangle(Vector):
             for fill in self.get("fills", []):
                 gradient_stops = fill.get("gradientStops", [])
                 hex_colors = [
-                    f"""ft.Colors.with_opacity({round(color['a'],3)}, "#{int(color['r'] * 255):02x}{int(color['g'] * 255):02x}{int(color['b'] * 255):02x}")"""
+                    self.styles.color(
+                        round(color["a"], 3),
+                        f"#{int(color['r'] * 255):02x}{int(color['g'] * 255):02x}{int(color['b'] * 255):02x}",
+                    )
                     for stop in gradient_stops
                     for color in [stop["color"]]
                 ]
@@ -165,40 +174,42 @@ class Rectangle(Vector):
         return self.node.get("rectangleCornerRadii")
 
     def to_code(self):
+        border_str = ""
+        if self.stroke:
+            border_opacity, border_color = self.stroke
+            border_color = self.styles.color(border_opacity, border_color)
+            border_str = f"border=ft.border.all({self.border_width},{border_color}),"
+
         effects = self.get_effects()
         gradient_str = ""
         if effects["gradient"]:
             gradient = effects["gradient"]
             if gradient["type"] == "GRADIENT_LINEAR":
-                gradient_str = f"""
-                gradient=ft.LinearGradient(
-                    colors=[{", ".join(gradient['colors'])}],
-                    # stops={gradient['stops']},
-                    begin={gradient['begin']},
-                    end={gradient['end']},
-                    rotation=3.1415
+                # stops are left out on purpose for linear gradients
+                gradient_str = self.styles.add(
+                    "GRADIENT",
+                    f"ft.LinearGradient(colors=[{', '.join(gradient['colors'])}], "
+                    f"begin={gradient['begin']}, end={gradient['end']}, rotation=3.1415)",
                 )
-                """
             if gradient["type"] == "GRADIENT_RADIAL":
-                gradient_str = f"""
-                gradient=ft.RadialGradient(
-                    colors=[{", ".join(gradient['colors'])}],
-                    stops={gradient['stops']},
+                gradient_str = self.styles.add(
+                    "GRADIENT",
+                    f"ft.RadialGradient(colors=[{', '.join(gradient['colors'])}], "
+                    f"stops={gradient['stops']})",
                 )
-                """
+            gradient_str = f"gradient={gradient_str},"
 
         # Shadow to flet compatible str
         shadow_str = ""
         if effects["shadow"]:
             shadow = effects["shadow"]
-            shadow_str = f"""
-            shadow=ft.BoxShadow(
-                spread_radius=2,
-                blur_radius={shadow['blur']//5},
-                offset=ft.Offset({shadow['offset_x']}, {shadow['offset_y']}),
-                color=ft.Colors.with_opacity(0.1,"{shadow['color']}")
-            ),
-            """
+            shadow_name = self.styles.add(
+                "SHADOW",
+                f"ft.BoxShadow(spread_radius=2, blur_radius={shadow['blur']//5}, "
+                f"offset=ft.Offset({shadow['offset_x']}, {shadow['offset_y']}), "
+                f"color={self.styles.color(0.1, shadow['color'])})",
+            )
+            shadow_str = f"shadow={shadow_name},"
         # blur to flet compatible str
         blur_str = ""
         if effects["background_blur"]:
@@ -207,23 +218,48 @@ class Rectangle(Vector):
 
         return f"""
         ft.Container(
-            left={self.x},
-            top={self.y},
+            {position_code(self.x, self.y)}
             width={self.width},
             height={self.height},
             {blur_str}
             {shadow_str}
             border_radius={self.corner_radius},
-            {self.border_str}
-            bgcolor=ft.Colors.with_opacity({self.opacity},'{self.bg_color}'),
+            {border_str}
+            bgcolor={self.styles.color(self.opacity, self.bg_color)},
             {gradient_str}
             )
 """
 
 
+def text_characters(node: dict) -> str:
+    """The characters a TEXT node displays, with its text case applied."""
+    string: str = node.get("characters")
+    text_case: str = node.get("style", {}).get("textCase", "ORIGINAL")
+
+    if text_case == "UPPER":
+        string = string.upper()
+    elif text_case == "LOWER":
+        string = string.lower()
+    elif text_case == "TITLE":
+        string = string.title()
+
+    return string
+
+
+def font_name(node: dict) -> str:
+    """The font family a TEXT node is set in, as named in `page.fonts`."""
+    style = node.get("style")
+
+    name = style.get("fontPostScriptName")
+    if name is None:
+        name = style["fontFamily"]
+    return name.replace("-", " ")
+
+
 class Text(Vector):
     def __init__(self, node, frame):
         super().__init__(node)
+        self.styles = frame.context.styles
         self.x, self.y = self.position(frame)
         self.width, self.height = self.size()
 
@@ -232,7 +268,7 @@ class Text(Vector):
         self.font_family, self.font_size, self.font_weight = self.font_property()
 
         if "\n" in self.characters:
-            self.text = f'"""{self.characters.replace("\n", "\\n")}"""'
+            self.text = '"""' + self.characters.replace("\n", "\\n") + '"""'
         else:
             self.text = f"'{self.characters}'"
 
@@ -240,17 +276,7 @@ class Text(Vector):
 
     @property
     def characters(self) -> str:
-        string: str = self.node.get("characters")
-        text_case: str = self.style.get("textCase", "ORIGINAL")
-
-        if text_case == "UPPER":
-            string = string.upper()
-        elif text_case == "LOWER":
-            string = string.lower()
-        elif text_case == "TITLE":
-            string = string.title()
-
-        return string
+        return text_characters(self.node)
 
     @property
     def style(self):
@@ -263,26 +289,25 @@ class Text(Vector):
     def font_property(self):
         style = self.node.get("style")
 
-        font_name = style.get("fontPostScriptName")
-        if font_name is None:
-            font_name = style["fontFamily"]
-
         # TEXT- Weight
         font_weight = style.get("fontWeight")
         if font_weight:
             font_weight = f"w{font_weight}"
 
-        font_name = font_name.replace("-", " ")
         font_size = style["fontSize"]
 
-        return font_name, font_size, font_weight
+        return font_name(self.node), font_size, font_weight
 
     def to_code(self):
+        text_style = self.styles.add(
+            "TEXT_STYLE",
+            f"ft.TextStyle(size={self.font_size}, color='{self.text_color}', "
+            f"weight='{self.font_weight}', font_family=\"{self.font_family}\")",
+        )
         return f"""
         ft.Container(
-            content=ft.Text(value={self.text}, size={self.font_size}, color='{self.text_color}',weight='{self.font_weight}',font_family="{self.font_family}",text_align=ft.TextAlign.{self.text_align}),
-            left={self.x},
-            top={self.y},
+            content=ft.Text(value={self.text}, style={text_style},text_align=ft.TextAlign.{self.text_align}),
+            {position_code(self.x, self.y)}
             )
         """
 
@@ -290,6 +315,7 @@ class Text(Vector):
 class TextField(Vector):
     def __init__(self, node, frame, hint_text, label_text, is_password):
         super().__init__(node)
+        self.styles = frame.context.styles
 
         self.x, self.y = self.position(frame)
         self.width, self.height = self.size()
@@ -331,30 +357,43 @@ class TextField(Vector):
                 can_reveal_password={self.is_password},
                 password={self.is_password}"""
         content_pad = int(self.height - (self.height / 1.5)) / 2
+        text_color = self.text_color_from_bg(self.bg_color)
+        text_style = self.styles.add(
+            "TEXT_STYLE", f"ft.TextStyle(color='{text_color}')"
+        )
 
         return f"""
         ft.Container(
             content=ft.TextField(
                 width={self.width},
                 height={self.height},
-                border_color=ft.Colors.with_opacity({self.border_opacity},'{self.border_color}'),
+                border_color={self.styles.color(self.border_opacity, self.border_color)},
                 border_radius={self.border_radius},
-                bgcolor=ft.Colors.with_opacity({self.opacity},'{self.bg_color}'),
+                bgcolor={self.styles.color(self.opacity, self.bg_color)},
                 cursor_height={self.height/1.5},
-                cursor_color='{self.text_color_from_bg(self.bg_color)}',
+                cursor_color='{text_color}',
                 focused_border_color='{self.border_color}',
                 content_padding={content_pad},
-                text_style=ft.TextStyle(color="{self.text_color_from_bg(self.bg_color)}"),
+                text_style={text_style},
                 {info_str}
                 {password_str}
                 ),
-            left={self.x},
-            top={self.y}, )
+            {position_code(self.x, self.y)} )
 """
 
 
 class Image(Vector):
-    def __init__(self, node, frame, image_path, *, id_):
+    def __init__(
+        self,
+        node,
+        frame,
+        image_path,
+        *,
+        id_,
+        placeholder=None,
+        variants=False,
+        pending=False,
+    ):
         super().__init__(node)
 
         self.x, self.y = self.position(frame)
@@ -362,11 +401,34 @@ class Image(Vector):
 
         self.image_path = image_path
         self.id_ = id_
+        # {"color", "thumbnail"} painted until the image is loaded, or None
+        self.placeholder = placeholder
+        # Exported per screen density: `asset()` of the app picks the file
+        self.variants = variants
+        # Not downloaded yet: only its room is kept, no broken image is shown
+        self.pending = pending
 
     def to_code(self):
-        return f"""
+        if self.pending:
+            return f"""
+ft.Container(
+    {position_code(self.x, self.y)}width={self.width},height={self.height})
+
+"""
+        src = f'asset("{self.image_path}")' if self.variants else f'"{self.image_path}"'
+        if self.placeholder is None:
+            return f"""
 ft.Image(
-    src="{self.image_path}",left={self.x},top={self.y},width={self.width},height={self.height})
+    src={src},{position_code(self.x, self.y)}width={self.width},height={self.height})
+
+"""
+        # The image is drawn over the container's color and blurred thumbnail
+        return f"""
+ft.Container(
+    content=ft.Image(src={src}, width={self.width}, height={self.height}, gapless_playback=True),
+    image=ft.DecorationImage(src_base64='{self.placeholder["thumbnail"]}', fit=ft.ImageFit.FILL),
+    bgcolor='{self.placeholder["color"]}',
+    {position_code(self.x, self.y)}width={self.width},height={self.height})
 
 """
 
@@ -374,6 +436,7 @@ ft.Image(
 class Button(Vector):
     def __init__(self, node, frame, text, text_color):
         super().__init__(node)
+        self.styles = frame.context.styles
         self.x, self.y = self.position(frame)
         self.width, self.height = self.size()
 
@@ -385,22 +448,21 @@ class Button(Vector):
         opacity, bg_color = self.color()
         radius = self.node.get("cornerRadius", 5)
 
+        button_style = self.styles.add(
+            "BUTTON_STYLE",
+            f"ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius={radius}), "
+            f"bgcolor={{ft.ControlState.DEFAULT: '{bg_color}', ft.ControlState.HOVERED: ''}}, "
+            f"color='{self.text_color}')",
+        )
+
         # Generate Flet button code
         return f"""
         ft.FilledButton(
             text='{self.text}',
             width={self.width},
             height={self.height},
-            style=ft.ButtonStyle(
-            shape=ft.RoundedRectangleBorder(radius={radius}),
-            bgcolor={{
-                    ft.ControlState.DEFAULT: '{bg_color}',
-                    ft.ControlState.HOVERED: '',
-                }},
-            color='{self.text_color}'
-            ),
-            left={self.x},
-            top={self.y},
+            style={button_style},
+            {position_code(self.x, self.y)}
         )"""
 
 
@@ -413,9 +475,38 @@ class UnknownElement(Vector):
     def to_code(self):
         return f"""
 ft.Container(
-    left={self.x},
-    top={self.y},
+    {position_code(self.x, self.y)}
     width={self.width},
     height={self.height},
     bgcolor="pink")
 """
+
+
+class Spacer(Vector):
+    """Room kept in an auto layout flow for a child that can't be seen."""
+
+    def __init__(self, node, frame):
+        super().__init__(node)
+        self.x, self.y = self.position(frame)
+        self.width, self.height = self.size()
+
+    def to_code(self):
+        return f"""
+ft.Container(
+    {position_code(self.x, self.y)}
+    width={self.width},
+    height={self.height})
+"""
+
+
+class CachedElement(Vector):
+    """An element of a kind generated by an earlier run: only placed here, its
+    code is replayed from the element cache (see `ElementCache`)."""
+
+    def __init__(self, node, frame, entry, element_type):
+        super().__init__(node)
+        self.x, self.y = self.position(frame)
+        self.width, self.height = self.size()
+        self.entry = entry
+        # Class it stands for, compared when looking for repeated siblings
+        self.element_type = element_type
@@ -1,50 +1,578 @@
-from jinja2 import Template
-from figmaflet.template import TEMPLATE
-from figmaflet.figma.frame import Frame
-from figmaflet.figma import endpoints
-from figmaflet.figma.vector_elements import Text
-from figmaflet.utils import get_fonts_urls
+import re
+import json
+from figmaflet.template import (
+    TEMPLATE,
+    SCREEN_TEMPLATE,
+    ENTRY_TEMPLATE,
+    DENSITY_CODE,
+    ASSET_CODE,
+)
+from figmaflet.cache import ElementCache, RenderCache
+from figmaflet.document import load_document, json_loads, json_dumps
+from figmaflet import shared_cache
+from figmaflet.figma.frame import Frame, element_kind
+from figmaflet.figma.context import Context
+from figmaflet.figma.index import NodeIndex
+from figmaflet.figma.prune import prune
+from figmaflet.figma.vector_elements import font_name, text_characters
+from figmaflet.utils import (
+    get_fonts_urls,
+    download_font,
+    node_digest,
+    write_atomic,
+    write_if_changed,
+)
 from pathlib import Path
 
 
+def get_module_name(name: str, taken) -> str:
+    """Turns a frame name into a unique, importable module name."""
+    module_name = re.sub(r"\W+", "_", name.strip().lower()).strip("_") or "frame"
+    if module_name[0].isdigit():
+        module_name = f"frame_{module_name}"
+
+    unique_name, i = module_name, 1
+    while f"screens.{unique_name}" in taken:
+        i += 1
+        unique_name = f"{module_name}_{i}"
+    return unique_name
+
+
 class UI:
-    def __init__(self, token: str, file_key: str, local_path: Path):
+    def __init__(
+        self,
+        token: str,
+        file_key: str,
+        local_path: Path,
+        bundle_fonts: bool = False,
+        bake_threshold: int = None,
+        split: bool = False,
+        min_list_items: int = 5,
+        file_data: dict = None,
+        resume: bool = False,
+        densities=(1,),
+    ):
 
-        self.figma_file = endpoints.Files(token, file_key)
-        self.file_data = self.figma_file.get_file()
+        self.file_key = file_key
         self.local_path = local_path
+        # Work of an interrupted run: document, image URLs, fonts and frames
+        checkpoint = self.load_checkpoint() if resume and file_data is None else None
+        if checkpoint:
+            file_data = load_document(self.local_path / ".figmaflet" / "document.json")
 
-        self.font_families = set()
+        # Without a token the document must be given (images can't be rendered)
+        self.figma_file = None
+        if token:
+            from figmaflet.figma import endpoints
 
-    def to_code(self):
+            self.figma_file = endpoints.Files(token, file_key)
+        if file_data is None:
+            if self.figma_file is None:
+                raise RuntimeError("A Figma API token or a saved document is needed.")
+            file_data = self.fetch_file()
+        self.file_data = file_data
+        self.version = self.file_data.get("version")
+        # Version the outputs were last generated from: a failed run leaves it
+        # behind `version`, so that the next `refresh` generates again
+        self.generated_version = None
+        # id, type, component and image lookups, rebuilt with every new version
+        self.index = NodeIndex(self.file_data["document"])
+        # Download subsetted font files into assets/ instead of linking to them
+        self.bundle_fonts = bundle_fonts
+        # Export decorative subtrees with this many descendants as one image
+        self.bake_threshold = bake_threshold
+        # One module per frame plus a lazy entry module instead of one main.py
+        self.split = split
+        # Repeated siblings become a ListView/GridView from this many (0: never)
+        self.min_list_items = min_list_items
+        # Screen densities images are exported for, picked by the app at runtime
+        self.densities = tuple(sorted({1, *densities}))
 
-        # Generate Flet code for each frame
-        for f in self.file_data["document"]["children"][0]["children"]:
-            frame = Frame(f, figma_file=self.figma_file, output_path=self.local_path)
-            # frames.append(frame.to_code())
+        # font family -> {"weight": ..., "text": characters rendered with it}
+        self.font_families = {}
 
-            # Collect font URLs from frame elements
-            self.collect_font_families(frame)
+        # Kept alive between regenerations (watch mode):
+        # frame id -> generated frame, image path -> digest, font path -> url
+        self.frames = {}
+        self.assets = {}
+        self.fonts = {}
+        # image path -> placeholder shown while the image loads
+        self.placeholders = {}
+        # Image render key -> render URL, font lookup -> "family:url"
+        self.image_urls = {}
+        self.font_items = {}
+        # Version of the document saved with the checkpoint
+        self.saved_version = None
+        # How the frame journal is opened next: "wb" starts a new one
+        self.journal_mode = "wb"
+        # Files of the current run: path -> whether it was written (or unchanged)
+        self.outputs = {}
+        self.removed = 0
+        # Images the current run still has to download (see `download_images`)
+        self.image_queue = []
+        self.load_state()
+        # Generated code of every element, also reused by the next runs
+        self.element_cache = ElementCache(local_path / ".figmaflet" / "elements.json")
+        # Images rendered by Figma, by node content, also reused by the next runs
+        self.render_cache = RenderCache(local_path / ".figmaflet" / "renders")
+
+        # Nodes removed by the last run because they can't be seen
+        self.pruned = []
+
+        if checkpoint:
+            self.use_checkpoint(checkpoint)
+
+    @classmethod
+    def from_document(
+        cls, path: Path, local_path: Path, token=None, file_key=None, **options
+    ) -> "UI":
+        """Generates from a saved document (snapshot or files endpoint JSON)
+        instead of fetching it. The token is then only used to render images."""
+        return cls(
+            token, file_key, local_path, file_data=load_document(path), **options
+        )
+
+    def refresh(self) -> bool:
+        """Re-fetches the file when its version moved. Returns True when there
+        is something to generate: a new version, or one that failed to."""
+        if self.figma_file is None:
+            return False
+        version = self.figma_file.get_version()
+        if version is None or version == self.version:
+            return self.generated_version != self.version
+
+        file_data = self.fetch_file(version)
+        if not isinstance(file_data, dict) or "document" not in file_data:
+            raise RuntimeError(f"Figma returned no document for version {version}.")
+        index = NodeIndex(file_data["document"])
+        self.file_data = file_data
+        self.version = file_data.get("version", version)
+        self.index = index
+        return True
+
+    def fetch_file(self, version: str = None) -> dict:
+        """Gets the file, from the host's shared cache when another process
+        already fetched this version of it."""
+        if shared_cache.cache is None:
+            return self.figma_file.get_file()
+        if version is None:
+            version = self.figma_file.get_version()
+        return json_loads(
+            shared_cache.cached(
+                f"document:{self.file_key}:{version}",
+                lambda: json_dumps(self.figma_file.get_file()),
+            )
+        )
+
+    def render_frame(self, f, asset_prefix="", screen=0) -> dict:
+        """Returns the generated code of a top-level frame, reusing the last one
+        when the frame did not change. Its new images are queued (see
+        `download_images`) with the priority of the frame's `screen` order."""
+        digest = node_digest(f)
+        cached = self.frames.get(f["id"])
+        if (
+            not cached
+            or cached["digest"] != digest
+            or cached["asset_prefix"] != asset_prefix
+            or cached.get("pending")
+        ):
+            # Drop what can't be seen before any element (or image) is made
+            pruned = []
+            images = {}
+            queued = len(self.image_queue)
+            context = Context(
+                self.local_path,
+                figma_file=self.figma_file,
+                assets=self.assets,
+                bake_threshold=self.bake_threshold,
+                asset_prefix=asset_prefix,
+                element_cache=self.element_cache,
+                outputs=images,
+                min_list_items=self.min_list_items,
+                image_urls=self.image_urls,
+                placeholders=self.placeholders,
+                render_cache=self.render_cache,
+                densities=self.densities,
+                image_queue=self.image_queue,
+            )
+            frame = Frame(prune(f, pruned), context)
 
-            font_list = [get_fonts_urls(family) for family in self.font_families]
+            # Above the fold first: by screen, then from the top of the screen
+            box = f.get("absoluteBoundingBox") or {}
+            for job in self.image_queue[queued:]:
+                position = job["element"].get("absoluteBoundingBox") or {}
+                job["priority"] = (
+                    screen,
+                    position.get("y", 0) - box.get("y", 0),
+                    position.get("x", 0) - box.get("x", 0),
+                )
 
-            font_urls = {
-                item.split(":")[0]: "https:" + item.split(":")[2] for item in font_list
+            # Collect font URLs from frame elements
+            self.font_families = {}
+            self.collect_font_families(f, pruned)
+
+            cached = self.frames[f["id"]] = {
+                "digest": digest,
+                "asset_prefix": asset_prefix,
+                "code": frame.to_code(),
+                "styles": context.styles.to_code(),
+                "fonts": self.font_families,
+                "pruned": pruned,
+                "images": list(images),
+                # Written without its queued images' placeholders
+                "pending": len(self.image_queue) > queued,
             }
+            self.add_outputs(images.items())
+            self.journal_frame(f["id"], cached)
+        else:
+            self.add_outputs((image, False) for image in cached["images"])
+        return cached
+
+    def use_frames(self, frames: list):
+        """Gathers the fonts and pruning report of the frames being written."""
+        self.font_families = {}
+        self.pruned = []
+        for frame in frames:
+            for family, font in frame["fonts"].items():
+                merged = self.font_families.setdefault(
+                    family, {"weight": font["weight"], "text": set()}
+                )
+                merged["text"] |= font["text"]
+            self.pruned += frame["pruned"]
+
+    def to_code(self):
+        from jinja2 import Template
+
+        # Generate Flet code for each frame
+        for f in self.file_data["document"]["children"][0]["children"]:
+            frame = self.render_frame(f)
+            self.use_frames([frame])
+            font_urls = self.get_font_urls()
 
             # Render the template
             t = Template(TEMPLATE)
-            rendered_code = t.render(elements=frame.to_code(), font_urls=font_urls)
+            rendered_code = t.render(
+                elements=frame["code"],
+                styles=frame["styles"],
+                font_urls=font_urls,
+                **self.density_options(),
+            )
             return rendered_code
 
-    def collect_font_families(self, frame):
-        for element in frame.elements:
-            if isinstance(element, Text):
-                self.font_families.add(element.font_family)
-            elif isinstance(element, Frame):
-                # Recursively collect from nested frames
-                self.collect_font_families(element)
+    def to_modules(self, only: int = None) -> dict:
+        """Returns {relative path: code} for the split layout: one module per
+        top-level frame (or component) in `screens/` and a thin `main.py` that
+        imports a screen only when it is first shown. With `only`, returns the
+        module of that screen alone."""
+        from jinja2 import Template
+
+        modules = {"screens/__init__.py": ""}
+        screens = {}
+        frames = []
+        for screen, f in enumerate(
+            self.file_data["document"]["children"][0]["children"]
+        ):
+            module_name = get_module_name(f["name"], screens.values())
+            if only is not None and screen != only:
+                screens[f"/{module_name}"] = f"screens.{module_name}"
+                continue
+            frame = self.render_frame(f, asset_prefix=f"{module_name}_", screen=screen)
+            frames.append(frame)
+
+            modules[f"screens/{module_name}.py"] = Template(SCREEN_TEMPLATE).render(
+                elements=frame["code"], styles=frame["styles"], **self.density_options()
+            )
+            screens[f"/{module_name}"] = f"screens.{module_name}"
+
+        if only is not None:
+            return modules
+        if screens:
+            screens["/"] = next(iter(screens.values()))
+
+        self.use_frames(frames)
+        modules["main.py"] = Template(ENTRY_TEMPLATE).render(
+            screens=screens, font_urls=self.get_font_urls(), **self.density_options()
+        )
+        return modules
+
+    def density_options(self) -> dict:
+        """Template values of the code picking image variants at runtime, none
+        when images are only exported at 1x."""
+        from jinja2 import Template
+
+        if len(self.densities) == 1:
+            return {}
+        return {
+            "densities": list(self.densities),
+            "density_code": Template(DENSITY_CODE).render(
+                densities=list(self.densities)
+            ),
+            "asset_code": ASSET_CODE,
+        }
+
+    def collect_font_families(self, f, pruned):
+        """Collects the fonts of the Text elements of top-level frame `f`, from
+        the index instead of walking the frame again."""
+        hidden = {node["id"] for node in pruned}
+        kinds = {}
+        for node in self.index.of_type("TEXT", f["id"]):
+            if not self.is_text_element(node, f, hidden, kinds):
+                continue
+            font = self.font_families.setdefault(
+                font_name(node),
+                {"weight": node["style"].get("fontWeight"), "text": set()},
+            )
+            font["text"].update(text_characters(node).replace("\n", ""))
+
+    def is_text_element(self, node, f, hidden, kinds) -> bool:
+        """Whether a TEXT node of `f` becomes a Text element: it was not pruned
+        and sits in nested frames only (not in a button or a baked group)."""
+        if node["id"] in hidden or element_kind(node) != "text":
+            return False
+        for parent in self.index.ancestors(node["id"]):
+            if parent["id"] == f["id"]:
+                return True
+            if parent["id"] not in kinds:
+                kinds[parent["id"]] = (
+                    "hidden"
+                    if parent["id"] in hidden
+                    else element_kind(parent, self.bake_threshold)
+                )
+            if kinds[parent["id"]] != "frame":
+                return False
+        return False
+
+    def get_font_urls(self) -> dict:
+        """Returns the `page.fonts` mapping, bundling the font files if asked."""
+        font_urls = {}
+        for family, font in self.font_families.items():
+            text = "".join(sorted(font["text"])) if self.bundle_fonts else None
+            key = json.dumps([family, font["weight"], text])
+            if key not in self.font_items:
+                self.font_items[key] = get_fonts_urls(family, font["weight"], text)
+            item = self.font_items[key]
+            name, url = item.split(":")[0], "https:" + item.split(":")[2]
+
+            if self.bundle_fonts:
+                font_path = self.local_path / "assets" / "fonts" / f"{name}.ttf"
+                if self.fonts.get(str(font_path)) != url or not font_path.exists():
+                    font_path.parent.mkdir(parents=True, exist_ok=True)
+                    written = download_font(url, font_path)
+                    self.fonts[str(font_path)] = url
+                else:
+                    written = False
+                self.outputs[str(font_path)] = written
+                url = f"fonts/{font_path.name}"
+
+            font_urls[name] = url
+        return font_urls
+
+    def pruned_summary(self) -> str:
+        reasons = {}
+        for node in self.pruned:
+            reasons[node["reason"]] = reasons.get(node["reason"], 0) + 1
+        details = ", ".join(f"{count} {reason}" for reason, count in reasons.items())
+        return f"Pruned {len(self.pruned)} hidden nodes" + (
+            f" ({details})." if details else "."
+        )
+
+    def load_state(self):
+        """Loads the images and fonts written by the previous run."""
+        path = self.local_path / ".figmaflet" / "assets.json"
+        if not path.exists():
+            return
+        try:
+            state = json.loads(path.read_text(encoding="UTF-8"))
+        except ValueError:
+            print(f"Ignoring corrupted asset state {path}.")
+            return
+        for name, digest in state.get("images", {}).items():
+            self.assets.setdefault(str(self.local_path / name), digest)
+        for name, url in state.get("fonts", {}).items():
+            self.fonts.setdefault(str(self.local_path / name), url)
+        for name, placeholder in state.get("placeholders", {}).items():
+            self.placeholders.setdefault(str(self.local_path / name), placeholder)
+
+    def save_state(self):
+        def relative(paths):
+            return {
+                Path(path).relative_to(self.local_path).as_posix(): value
+                for path, value in paths.items()
+            }
+
+        path = self.local_path / ".figmaflet" / "assets.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "images": relative(self.assets),
+            "fonts": relative(self.fonts),
+            "placeholders": relative(self.placeholders),
+        }
+        write_atomic(path, json.dumps(state, indent=2))
+        self.element_cache.save()
+        self.render_cache.evict()
+
+    def load_checkpoint(self) -> dict:
+        """Returns the checkpoint of an unfinished run of the same file."""
+        path = self.local_path / ".figmaflet" / "checkpoint.json"
+        if not path.exists():
+            return None
+        try:
+            checkpoint = json.loads(path.read_text(encoding="UTF-8"))
+        except ValueError:
+            print(f"Ignoring corrupted checkpoint {path}.")
+            return None
+        if checkpoint.get("file_key") != self.file_key:
+            return None
+        return checkpoint
+
+    def use_checkpoint(self, checkpoint: dict):
+        self.saved_version = self.version
+        self.image_urls.update(checkpoint["image_urls"])
+        self.font_items.update(checkpoint["font_items"])
+        # Later lines of the journal replace the earlier ones of a frame
+        path = self.local_path / ".figmaflet" / "frames.jsonl"
+        lines = path.read_bytes().splitlines() if path.exists() else []
+        for line in lines:
+            try:
+                frame = json_loads(line)
+            except ValueError:  # cut short by a killed process
+                continue
+            for font in frame["fonts"].values():
+                font["text"] = set(font["text"])
+            self.frames[frame.pop("id")] = frame
+        self.journal_mode = "ab"
+
+    def journal_frame(self, frame_id, frame: dict):
+        """Appends a finished frame to the checkpoint's frame journal, so a
+        checkpoint costs a line per frame rather than a rewrite of them all."""
+        fonts = {
+            family: {"weight": font["weight"], "text": "".join(sorted(font["text"]))}
+            for family, font in frame["fonts"].items()
+        }
+        path = self.local_path / ".figmaflet" / "frames.jsonl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A run that doesn't resume starts a new journal
+        with open(path, self.journal_mode) as file:
+            file.write(json_dumps({"id": frame_id, **frame, "fonts": fonts}) + b"\n")
+        self.journal_mode = "ab"
+
+    def save_checkpoint(self):
+        """Saves the work done so far, so that `resume=True` continues from
+        here without repeating its network calls. Called once a run failed or
+        was interrupted: finished frames are in the journal already."""
+        path = self.local_path / ".figmaflet" / "checkpoint.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if self.saved_version != self.version:
+            write_atomic(path.parent / "document.json", json_dumps(self.file_data))
+            self.saved_version = self.version
+
+        if self.journal_mode == "wb":
+            # No frame finished: the journal left is from an older run
+            (path.parent / "frames.jsonl").unlink(missing_ok=True)
+        checkpoint = {
+            "file_key": self.file_key,
+            "version": self.version,
+            "image_urls": self.image_urls,
+            "font_items": self.font_items,
+        }
+        write_atomic(path, json_dumps(checkpoint))
+        self.save_state()
+
+    def remove_checkpoint(self):
+        for name in ("checkpoint.json", "document.json", "frames.jsonl"):
+            path = self.local_path / ".figmaflet" / name
+            if path.exists():
+                path.unlink()
+        self.saved_version = None
+        self.journal_mode = "wb"
+
+    def remove_stale_assets(self) -> int:
+        """Deletes the images and fonts of earlier runs that this run did not
+        produce. Files figmaflet did not write are never touched."""
+        removed = 0
+        for paths in (self.assets, self.fonts):
+            for path in [path for path in paths if path not in self.outputs]:
+                del paths[path]
+                if Path(path).exists():
+                    Path(path).unlink()
+                    removed += 1
+        for path in [path for path in self.placeholders if path not in self.assets]:
+            del self.placeholders[path]
+        return removed
 
     def generate(self):
-        code = self.to_code()
-        self.local_path.joinpath("main.py").write_text(code, encoding="UTF-8")
+        try:
+            self.write_outputs()
+        except BaseException:
+            # Failed or interrupted (Ctrl-C): keep what is done for `resume`
+            self.save_checkpoint()
+            raise
+        self.remove_checkpoint()
+        self.generated_version = self.version
+
+    def write_outputs(self):
+        self.outputs = {}
+        self.image_queue = []
+        modules = self.render_modules()
+        # Runnable right away, with room kept for the images: each screen is
+        # written again once its own images are downloaded
+        self.write_modules(modules)
+        for screen in self.download_images():
+            self.write_modules(self.render_modules(screen))
+
+        self.removed = self.remove_stale_assets()
+        if self.split:
+            # Screens of frames that no longer exist
+            screens_path = self.local_path / "screens"
+            for module in screens_path.glob("*.py"):
+                if f"screens/{module.name}" not in modules:
+                    module.unlink()
+                    self.removed += 1
+
+            # Ship the bytecode too, so the app doesn't compile screens at startup
+            import compileall
+
+            compileall.compile_dir(screens_path, quiet=1)
+
+        self.save_state()
+
+    def render_modules(self, screen: int = None) -> dict:
+        """Returns {relative path: code} of the output, or of the module
+        showing `screen` only."""
+        if self.split:
+            return self.to_modules(only=screen)
+        # A single main.py shows the first screen
+        return {"main.py": self.to_code()}
+
+    def write_modules(self, modules: dict):
+        for path, code in modules.items():
+            (self.local_path / path).parent.mkdir(parents=True, exist_ok=True)
+            written = write_if_changed(self.local_path / path, code)
+            self.add_outputs([(str(self.local_path / path), written)])
+
+    def download_images(self):
+        """Downloads the queued images in priority order: screen by screen,
+        each from its top, so what a screen shows first arrives first. Yields
+        every screen once its images are downloaded."""
+        jobs = sorted(self.image_queue, key=lambda job: job["priority"])
+        self.image_queue = []
+        for i, job in enumerate(jobs):
+            frame = job["frame"]
+            outputs = frame.fetch_image(job["element"], job["path"], job["digest"])
+            self.add_outputs(outputs.items())
+            screen = job["priority"][0]
+            if i + 1 == len(jobs) or jobs[i + 1]["priority"][0] != screen:
+                yield screen
+
+    def add_outputs(self, outputs):
+        """Records (path, written) pairs: a file written earlier in the run
+        counts as written."""
+        for path, written in outputs:
+            self.outputs[path] = self.outputs.get(path, False) or written
+
+    def write_summary(self) -> str:
+        written = sum(self.outputs.values())
+        return (
+            f"Wrote {written} files, skipped {len(self.outputs) - written} unchanged, "
+            f"removed {self.removed} stale."
+        )
@@ -0,0 +1,211 @@
+from figmaflet.figma.frame import CACHED_KINDS, Frame, element_kind, is_auto_layout
+from figmaflet.figma.lists import find_runs
+from figmaflet.figma.node import Node
+from figmaflet.figma.prune import prune
+from figmaflet.figma.vector_elements import Image, Vector, font_name
+
+# Flet controls emitted per element kind, each one nested in the previous one
+# (e.g. Text is a Container + ft.Text, an image a Container + ft.Image painted
+# over its placeholder)
+CONTROLS = {
+    "button": 1,
+    "textfield": 2,
+    "baked": 2,
+    "image": 2,
+    "rectangle": 1,
+    "text": 2,
+    "spacer": 1,
+    "unknown": 1,
+}
+
+# Classes of the elements `Frame.create_element` makes, compared by `find_runs`
+ELEMENT_TYPES = {**CACHED_KINDS, "baked": Image, "image": Image, "frame": Frame}
+
+# Rough PNG size per pixel: 4 bytes of RGBA, ~1/3 left after compression
+BYTES_PER_PIXEL = 4 / 3
+
+
+def count_nodes(node: dict) -> int:
+    return 1 + sum(count_nodes(child) for child in node.get("children", []))
+
+
+def placed(child: dict, kind: str, node: dict) -> Vector:
+    """A stand-in for the element made of `child`, placed in the frame `node`
+    like the real one, for `find_runs`."""
+    element = Vector(child)
+    element.element_type = ELEMENT_TYPES[kind]
+    element.width, element.height = element.size()
+    if kind == "frame":
+        bbox, frame_bbox = child["absoluteBoundingBox"], node["absoluteBoundingBox"]
+        element.x = int(bbox["x"] - frame_bbox["x"])
+        element.y = int(bbox["y"] - frame_bbox["y"])
+    else:
+        element.x, element.y = element.position(Node(node))
+    return element
+
+
+def list_runs(node: dict, children: list, kinds: list, min_list_items: int):
+    """(start, end) of the runs of children that `Frame.children_code` emits
+    as a ListView/GridView, assuming the items only differ by their values."""
+    if not min_list_items or is_auto_layout(node):
+        return []
+    elements = [placed(child, kind, node) for child, kind in zip(children, kinds)]
+    return [(start, end) for start, end, _ in find_runs(elements, min_list_items)]
+
+
+def cached_render(node: dict, render_cache):
+    """Path of the render of `node` in the render cache, or None when it
+    would be asked to Figma."""
+    if render_cache is None:
+        return None
+    path = render_cache.path / f"{render_cache.key(node)}.png"
+    return path if path.exists() else None
+
+
+def image_controls(render) -> int:
+    """Controls of an image: a bare ft.Image when its render (known once it is
+    in the render cache) has transparent pixels, as no placeholder is painted
+    under it then."""
+    if render is None:
+        return CONTROLS["image"]
+    from figmaflet.utils import read_placeholder
+
+    return 1 if read_placeholder(render) is None else 2
+
+
+def plan_frame(
+    node: dict,
+    report: dict,
+    depth: int,
+    bake_threshold=None,
+    min_list_items=5,
+    render_cache=None,
+):
+    """Adds what generating `node` (a frame) would cost to `report`."""
+    children = [
+        child for child in node.get("children", []) if child.get("visible", True)
+    ]
+
+    # The frame itself is a Container, holding a Stack (or Row/Column) when it
+    # has children
+    depth += 2 if children else 1
+    report["controls"] += 2 if children else 1
+    report["depth"] = max(report["depth"], depth)
+
+    kinds = [element_kind(child, bake_threshold) for child in children]
+    runs = list_runs(node, children, kinds, min_list_items)
+    starts = {start for start, _ in runs}
+    items = {i for start, end in runs for i in range(start, end)}
+    for i, (child, kind) in enumerate(zip(children, kinds)):
+        report["elements"][kind] = report["elements"].get(kind, 0) + 1
+
+        # A run starts with its ListView/GridView, its items are one level deeper
+        child_depth = depth + 1 if i in items else depth
+        if i in starts:
+            report["lists"] += 1
+            report["controls"] += 1
+            report["depth"] = max(report["depth"], child_depth)
+
+        if kind == "frame":
+            plan_frame(
+                child, report, child_depth, bake_threshold, min_list_items, render_cache
+            )
+            continue
+
+        controls = CONTROLS[kind]
+        if kind in ("image", "baked"):
+            render = cached_render(child, render_cache)
+            controls = image_controls(render)
+            report["images"] += 1
+            if render is None:
+                bbox = child.get("absoluteBoundingBox") or {}
+                report["renders"] += 1
+                # Images are rendered at scale 2: 4 times the pixels
+                pixels = bbox.get("width", 0) * bbox.get("height", 0) * 4
+                report["asset_bytes"] += int(pixels * BYTES_PER_PIXEL)
+        elif kind == "text":
+            report["fonts"].add(font_name(child))
+        report["controls"] += controls
+        report["depth"] = max(report["depth"], child_depth + controls)
+
+
+def plan(
+    file_data: dict, bake_threshold=None, min_list_items=5, render_cache=None
+) -> dict:
+    """Estimates the cost of generating every top-level frame of a document,
+    without creating elements or downloading anything. Images found in
+    `render_cache` (the `RenderCache` of an earlier output) are not rendered
+    again."""
+    report = {
+        "frames": [],
+        "nodes": 0,
+        "pruned": 0,
+        "elements": {},
+        "images": 0,
+        "renders": 0,
+        "asset_bytes": 0,
+        "fonts": set(),
+        "controls": 0,
+        "lists": 0,
+        "depth": 0,
+    }
+    for f in file_data["document"]["children"][0]["children"]:
+        removed = []
+        f = prune(f, removed)
+
+        frame_report = {
+            "name": f["name"],
+            "nodes": count_nodes(f),
+            "pruned": len(removed),
+            "elements": {},
+            "images": 0,
+            "renders": 0,
+            "asset_bytes": 0,
+            "fonts": set(),
+            "controls": 1,  # the page's root Stack
+            "lists": 0,
+            "depth": 1,
+        }
+        plan_frame(f, frame_report, 1, bake_threshold, min_list_items, render_cache)
+        report["frames"].append(frame_report)
+
+        for key in (
+            "nodes",
+            "pruned",
+            "images",
+            "renders",
+            "asset_bytes",
+            "controls",
+            "lists",
+        ):
+            report[key] += frame_report[key]
+        for kind, count in frame_report["elements"].items():
+            report["elements"][kind] = report["elements"].get(kind, 0) + count
+        report["fonts"] |= frame_report["fonts"]
+        report["depth"] = max(report["depth"], frame_report["depth"])
+    return report
+
+
+def print_plan(report: dict):
+    for f in report["frames"]:
+        print(
+            f"  {f['name']}: {f['nodes']} nodes ({f['pruned']} pruned), "
+            f"{f['controls']} controls, depth {f['depth']}, {f['images']} images"
+        )
+
+    elements = ", ".join(
+        f"{n} {kind}" for kind, n in sorted(report["elements"].items())
+    )
+    print(f"Nodes: {report['nodes']} ({report['pruned']} hidden subtrees pruned)")
+    print(f"Elements: {elements or 'none'}")
+    print(
+        f"Figma API calls: {1 + report['renders']} "
+        f"(1 file, {report['renders']} image renders, "
+        f"{report['images'] - report['renders']} images in the render cache)"
+    )
+    print(f"Fonts: {len(report['fonts'])} ({', '.join(sorted(report['fonts']))})")
+    print(f"Estimated asset download: {report['asset_bytes'] / 1e6:.1f} MB")
+    print(
+        f"Flet controls: {report['controls']} ({report['lists']} lists), "
+        f"max nesting depth {report['depth']}"
+    )
@@ -0,0 +1,128 @@
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Debouncer:
+    """Regenerates a file once its edits have stopped for `delay` seconds:
+    a burst of webhook events makes a single regeneration."""
+
+    def __init__(self, uis: dict, delay: float = 2.0):
+        self.uis = uis
+        self.delay = delay
+        self.timers = {}
+        self.locks = {file_key: threading.Lock() for file_key in uis}
+        self._lock = threading.Lock()
+
+    def schedule(self, file_key: str):
+        with self._lock:
+            if file_key in self.timers:
+                self.timers[file_key].cancel()
+            timer = threading.Timer(self.delay, self.regenerate, [file_key])
+            timer.daemon = True
+            self.timers[file_key] = timer
+            timer.start()
+
+    def regenerate(self, file_key: str):
+        ui = self.uis[file_key]
+        with self.locks[file_key]:
+            try:
+                if ui.refresh():
+                    ui.generate()
+                    print(f"{file_key} version {ui.version}: {ui.write_summary()}")
+            except RuntimeError as e:
+                print(f"{file_key}: {e}")
+
+
+def make_handler(debouncer: Debouncer, passcode: str):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        """Receives Figma webhooks (https://www.figma.com/developers/api#webhooks_v2)."""
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                event = json.loads(self.rfile.read(length))
+            except ValueError:
+                return self.reply(400, "Invalid payload.")
+            if not isinstance(event, dict):
+                return self.reply(400, "Invalid payload.")
+
+            if not hmac.compare_digest(
+                str(event.get("passcode", "")).encode(), passcode.encode()
+            ):
+                return self.reply(403, "Invalid passcode.")
+
+            file_key = event.get("file_key")
+            if event.get("event_type") not in ("FILE_UPDATE", "FILE_VERSION_UPDATE"):
+                return self.reply(200, "Ignored event.")
+            if file_key not in debouncer.uis:
+                return self.reply(200, "Ignored file.")
+
+            debouncer.schedule(file_key)
+            self.reply(200, "Scheduled.")
+
+        def reply(self, status: int, message: str):
+            body = message.encode("UTF-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def make_server(
+    uis: dict,
+    passcode: str,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    debounce: float = 2.0,
+) -> ThreadingHTTPServer:
+    """Returns the server regenerating `uis` on webhooks, not started yet.
+    Port 0 picks a free port (see `server_port`)."""
+    debouncer = Debouncer(uis, debounce)
+    return ThreadingHTTPServer((host, port), make_handler(debouncer, passcode))
+
+
+def serve(
+    uis: dict,
+    passcode: str,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    debounce: float = 2.0,
+):
+    """Generates every UI of `uis` (file key -> UI), then regenerates a file
+    each time a Figma webhook reports an update of it."""
+    for file_key, ui in uis.items():
+        ui.generate()
+        print(f"Generated {file_key} version {ui.version}.")
+
+    server = make_server(uis, passcode, host, port, debounce)
+    print(f"Listening for Figma webhooks on http://{host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def send_event(
+    url: str, file_key: str, passcode: str, event_type: str = "FILE_UPDATE"
+) -> int:
+    """Posts a sample webhook payload, standing in for Figma. Returns the
+    HTTP status of the response."""
+    import requests
+
+    payload = {
+        "event_type": event_type,
+        "file_key": file_key,
+        "file_name": file_key,
+        "passcode": passcode,
+        "timestamp": "2024-01-01T00:00:00Z",
+        "webhook_id": "0",
+    }
+    return requests.post(url, json=payload).status_code
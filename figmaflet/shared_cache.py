@@ -0,0 +1,184 @@
+"""A cache directory shared by every figmaflet process of a host (developers,
+CI jobs): documents, images and fonts fetched by one process are reused by
+the others instead of being fetched again.
+
+Entries are published atomically (written to a temporary file, then renamed),
+a lock file per missing key makes only one process fetch it while the others
+wait for it, and the least recently used entries are evicted once the
+directory grows over its size bound.
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Temporary and lock files older than this are left over by a killed process
+STALE_SECONDS = 3600
+
+# Evicting scans the whole directory: a process does it each time it has
+# written this share of the size bound since its last eviction
+EVICT_SHARE = 0.1
+
+
+@contextmanager
+def locked(path: Path):
+    """Holds an exclusive lock on `path` (created if needed) across processes."""
+    with open(path, "a+b") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SharedCache:
+    """Byte entries stored under `path`, bounded to `max_bytes` (None: no
+    bound). Each process may go over the bound by `EVICT_SHARE` of it before
+    evicting."""
+
+    def __init__(self, path: Path, max_bytes: int = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.objects = self.path / "objects"
+        self.locks = self.path / "locks"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.locks.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        # Bytes this process put since it last evicted
+        self.written = 0
+
+    def name(self, key: str) -> str:
+        return hashlib.sha1(key.encode("UTF-8")).hexdigest()
+
+    def get(self, key: str) -> bytes:
+        """Returns the entry, or None. Reading it makes it recently used."""
+        path = self.objects / self.name(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:  # missing, or evicted meanwhile
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.objects, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            # Readable by the other users of the host
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.objects / self.name(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        if self.max_bytes is not None:
+            self.written += len(data)
+            if self.written >= self.max_bytes * EVICT_SHARE:
+                self.evict()
+
+    def fetch(self, key: str, produce) -> bytes:
+        """Returns the entry for `key`, calling `produce()` to make it when it
+        is missing. Concurrent processes asking for the same key wait for the
+        one producing it instead of producing it again."""
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        lock_path = self.locks / self.name(key)
+        with locked(lock_path):
+            data = self.get(key)
+            if data is None:
+                self.misses += 1
+                data = produce()
+                self.put(key, data)
+            else:
+                self.hits += 1
+            # Published: the lock is only needed while the entry is missing
+            try:
+                os.unlink(lock_path)
+            except OSError:  # removed by another waiter, or open (Windows)
+                pass
+        return data
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits, and
+        the lock files left over by failed or killed processes."""
+        self.written = 0
+        with locked(self.path / "evict.lock"):
+            entries = []
+            total = 0
+            now = time.time()
+            with os.scandir(self.locks) as scan:
+                for entry in scan:
+                    try:
+                        if now - entry.stat().st_mtime > STALE_SECONDS:
+                            os.unlink(entry.path)
+                    except OSError:  # removed meanwhile, or held (Windows)
+                        continue
+            if self.max_bytes is None:
+                return
+
+            with os.scandir(self.objects) as scan:
+                for entry in scan:
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.startswith(".tmp-"):
+                        if now - stat.st_mtime > STALE_SECONDS:
+                            os.unlink(entry.path)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# The host cache of this process, see `configure` (None: no shared cache)
+cache = None
+
+
+def configure(path, max_mb=None):
+    global cache
+    cache = SharedCache(path, max_mb and int(max_mb * 2**20)) if path else None
+    if cache is not None:
+        # Fits the bound left by earlier processes, which evict only now and then
+        cache.evict()
+
+
+def cached(key: str, produce) -> bytes:
+    """`produce()`, through the shared cache when one is configured."""
+    if cache is None:
+        return produce()
+    return cache.fetch(key, produce)
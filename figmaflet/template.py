@@ -3,10 +3,17 @@ TEMPLATE = """
 # https://github.com/Benitmulindwa/FigmaFlet
 
 import flet as ft
+{% if densities %}
+{{ density_code }}
+{{ asset_code }}
+{% endif %}
+{{ styles }}
 
 def main(page: ft.Page):
     page.padding=0
-    page.fonts={{font_urls}}
+    page.fonts={{font_urls}}{% if densities %}
+    global density
+    density = pixel_density(page){% endif %}
     page.add(
        ft.Stack([
         {{ elements }}
@@ -14,3 +21,77 @@ def main(page: ft.Page):
     )
 ft.app(target=main)
 """
+
+# Split layout (one module per frame): see `UI.to_modules`
+SCREEN_TEMPLATE = """
+# This file was generated by FigmaFlet by Benit Mulindwa
+# https://github.com/Benitmulindwa/FigmaFlet
+
+import flet as ft
+{% if densities %}
+{{ asset_code }}
+{% endif %}
+{{ styles }}
+
+def view():
+    return ft.Stack([
+        {{ elements }}
+        ])
+"""
+
+ENTRY_TEMPLATE = """
+# This file was generated by FigmaFlet by Benit Mulindwa
+# https://github.com/Benitmulindwa/FigmaFlet
+
+import importlib
+import flet as ft
+{% if densities %}
+{{ density_code }}
+{% endif %}
+# route -> screen module, imported the first time the screen is shown
+SCREENS = {{ screens }}
+
+def main(page: ft.Page):
+    page.padding=0
+    page.fonts={{font_urls}}
+
+    def route_change(e):
+        screen = importlib.import_module(SCREENS.get(page.route, SCREENS["/"])){% if densities %}
+        screen.density = pixel_density(page){% endif %}
+        page.clean()
+        page.add(screen.view())
+
+    page.on_route_change = route_change
+    route_change(None)
+ft.app(target=main)
+"""
+
+# Images exported for several screen densities (see `UI.densities`)
+DENSITY_CODE = """
+import os
+
+# Screen densities the images were exported for
+DENSITIES = {{ densities }}
+
+
+def pixel_density(page):
+    # The smallest exported density covering the device pixel ratio. Flet 1.0
+    # reports it in page.media; with older versions, set FIGMAFLET_PIXEL_RATIO
+    # (e.g. 2 on a HiDPI screen), else the 1x images are used.
+    ratio = getattr(getattr(page, "media", None), "device_pixel_ratio", None)
+    ratio = ratio or float(os.environ.get("FIGMAFLET_PIXEL_RATIO") or 1)
+    return next((d for d in DENSITIES if d >= ratio), DENSITIES[-1])
+"""
+
+ASSET_CODE = """
+# Screen density of the images, set from the page before building controls
+density = 1
+
+
+def asset(name):
+    # image.png, image@2x.png or image@3x.png
+    if density == 1:
+        return name
+    stem, extension = name.rsplit(".", 1)
+    return f"{stem}@{density}x.{extension}"
+"""
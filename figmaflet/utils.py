@@ -1,16 +1,42 @@
 import io
-import requests
-from PIL import Image
+import os
+import stat
+import base64
+import json
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import quote
 
 
-def get_fonts_urls(font_family):
+@lru_cache(maxsize=None)
+def get_fonts_urls(font_family, weight=None, text=None):
+    """Returns "<font_family>:<font file URL>" from Google Fonts.
+
+    `weight` (e.g. 700) selects the matching file of the family, `text` asks
+    Google Fonts for a file subset to the glyphs of that text only.
+    """
     # Format the font-family name for URL
     font_family_name = font_family.split()
     # print(font_family_url)
     google_fonts_url = f"https://fonts.googleapis.com/css2?family={font_family_name[0]}"
-    # print(google_fonts_url)
+    candidates = [google_fonts_url]
+    if weight:
+        # Not every family has every weight: fall back to the default one
+        candidates.insert(0, f"{google_fonts_url}:wght@{weight}")
+    if text:
+        candidates = [f"{url}&text={quote(text)}" for url in candidates]
+
+    from figmaflet.figma.endpoints import session
+
     # Fetch the font CSS
-    response = requests.get(google_fonts_url)
+    for google_fonts_url in candidates:
+        response = session.get(google_fonts_url)
+        if response.status_code == 200:
+            break
     if response.status_code == 200:
         css_content = response.text
 
@@ -30,10 +56,200 @@ def get_fonts_urls(font_family):
         return f"Grandstander Regular:https://fonts.gstatic.com/s/grandstander/v18/ga6fawtA-GpSsTWrnNHPCSIMZhhKpFjyNZIQD1--D3g.ttf"
 
 
-def download_image(url, image_path):
-    response = requests.get(url)
-    content = io.BytesIO(response.content)
-    im = Image.open(content)
-    im = im.resize((im.size[0] // 2, im.size[1] // 2), Image.LANCZOS)
-    with open(image_path, "wb") as file:
-        im.save(file)
+def download_font(url, font_path) -> bool:
+    from figmaflet.figma.endpoints import session
+    from figmaflet.shared_cache import cached
+
+    content = cached(f"font:{url}", lambda: session.get(url).content)
+    return write_if_changed(font_path, content)
+
+
+# Downloads are streamed to disk in chunks of this size
+CHUNK_SIZE = 1 << 20
+
+# Seconds to wait to connect to an image host and between received bytes
+DOWNLOAD_TIMEOUT = 30
+
+
+class MemoryBudget:
+    """Bounds the bytes of decoded bitmaps held at once, across every thread
+    of the process. `limit=None` disables the bound; an image larger than the
+    limit is still decoded, alone."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, size: int):
+        with self._condition:
+            while self.limit and self.in_use and self.in_use + size > self.limit:
+                self._condition.wait()
+            self.in_use += size
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= size
+                self._condition.notify_all()
+
+
+image_memory = MemoryBudget()
+
+# Longest side of the inline thumbnail shown while an image loads
+THUMBNAIL_SIZE = 16
+
+
+def image_placeholder(im) -> dict:
+    """Returns the average color and a tiny base64 PNG of an image, shown
+    until the image itself is loaded. None when the image has transparent
+    pixels, which would let the placeholder show through."""
+    from PIL import Image
+
+    if im.mode in ("RGBA", "LA", "P") and im.convert("RGBA").getextrema()[3][0] < 255:
+        return None
+
+    im = im.convert("RGB")
+    r, g, b = im.resize((1, 1), Image.BOX).getpixel((0, 0))
+    thumbnail = im.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    output = io.BytesIO()
+    thumbnail.save(output, format="PNG", optimize=True)
+    return {
+        "color": f"#{r:02x}{g:02x}{b:02x}",
+        "thumbnail": base64.b64encode(output.getvalue()).decode("ascii"),
+    }
+
+
+def read_placeholder(image_path) -> dict:
+    """`image_placeholder` of an image already saved by `download_image`."""
+    from PIL import Image
+
+    with Image.open(image_path) as im:
+        return image_placeholder(im)
+
+
+def density_path(image_path, density: int) -> Path:
+    """Path of the `density` variant of an image: image.png, image@2x.png..."""
+    image_path = Path(image_path)
+    if density == 1:
+        return image_path
+    return image_path.with_name(f"{image_path.stem}@{density}x{image_path.suffix}")
+
+
+def render_scale(densities) -> int:
+    """Scale to render at for `densities`: downscaling from at least 2x keeps
+    the 1x variant antialiased."""
+    return max(2, *densities)
+
+
+def download_image(url, image_path, placeholders=None, densities=(1,), scale=2):
+    """Downloads an image rendered at `scale` and saves a PNG of it for every
+    density of `densities` (see `density_path`). Returns {density: whether
+    its file was written}.
+
+    The download goes to a temporary file instead of memory, and JPEGs are
+    decoded directly at the reduced size. Decoding waits for room in
+    `image_memory`. When `placeholders` is given, the image's placeholder
+    (see `image_placeholder`) is stored in it under the image path.
+    """
+    import requests
+    from figmaflet.figma.endpoints import session
+
+    image_path = Path(image_path)
+    with tempfile.TemporaryFile() as file:
+        try:
+            with session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                # An expired render URL answers 403 with an XML error body
+                response.raise_for_status()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+        except requests.RequestException as e:
+            raise RuntimeError(f"Failed to download image {image_path.name}: {e}.")
+        file.seek(0)
+
+        try:
+            outputs = resize_image(file, image_path, placeholders, densities, scale)
+        except OSError:  # not an image (UnidentifiedImageError), or truncated
+            raise RuntimeError(
+                f"Downloaded image {image_path.name} is not a valid image."
+            )
+    return {
+        density: write_if_changed(density_path(image_path, density), data)
+        for density, data in outputs.items()
+    }
+
+
+def resize_image(file, image_path, placeholders, densities, scale) -> dict:
+    """Returns {density: PNG bytes} of the image in `file` (see `download_image`)."""
+    from PIL import Image
+
+    # Only the header is read here: the sizes are known before decoding
+    with Image.open(file) as im:
+        sizes = {
+            density: (im.size[0] * density // scale, im.size[1] * density // scale)
+            for density in densities
+        }
+        im.draft(im.mode, max(sizes.values()))  # JPEG only: decode reduced
+        bands = len(im.getbands())
+        decoded = im.size[0] * im.size[1] * bands
+        variants = sum(width * height * bands for width, height in sizes.values())
+        with image_memory.reserve(decoded + variants):
+            outputs = {}
+            for density, size in sizes.items():
+                output = io.BytesIO()
+                small = im if size == im.size else im.resize(size, Image.LANCZOS)
+                small.save(output, format="PNG")
+                outputs[density] = output.getvalue()
+                if density == 1 and placeholders is not None:
+                    placeholders[str(image_path)] = image_placeholder(small)
+    return outputs
+
+
+def node_digest(node: dict) -> str:
+    """Returns a stable hash of a node and its whole subtree."""
+    data = json.dumps(node, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(data.encode("UTF-8")).hexdigest()
+
+
+# Mode `open()` gives new files under the process umask (read once: setting
+# the umask to read it is not thread safe)
+_umask = os.umask(0o022)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+
+def write_atomic(path, content):
+    """Writes `content` (str or bytes) to `path` through a temporary file and a
+    rename, so a watcher (e.g. `flet run`) never sees a half-written file. The
+    file keeps its mode, or gets the one `open()` would give a new file."""
+    path = Path(path)
+    data = content.encode("UTF-8") if isinstance(content, str) else content
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+        # mkstemp makes the file readable by its owner only
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_if_changed(path, content) -> bool:
+    """Writes `content` atomically unless `path` already holds exactly that
+    content, so unchanged files keep their mtime (no hot reload, no rebuild).
+    Returns True if the file was written."""
+    path = Path(path)
+    data = content.encode("UTF-8") if isinstance(content, str) else content
+    if path.exists() and path.stat().st_size == len(data) and path.read_bytes() == data:
+        return False
+    write_atomic(path, data)
+    return True
@@ -0,0 +1,21 @@
+import time
+from figmaflet.generateUI import UI
+
+
+def watch(ui: UI, interval: float = 5.0):
+    """Regenerates `ui` every time the Figma file's version moves.
+
+    The process (and with it the parsed document, downloaded assets and font
+    lookups) stays alive between runs, so only changed frames are rebuilt.
+    """
+    ui.generate()
+    print(f"Generated version {ui.version}. Watching for changes...")
+
+    while True:
+        time.sleep(interval)
+        try:
+            if ui.refresh():
+                ui.generate()
+                print(f"Version {ui.version}: {ui.write_summary()}")
+        except RuntimeError as e:
+            print(f"{e} Retrying in {interval}s.")
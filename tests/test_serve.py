@@ -0,0 +1,120 @@
+"""Serve mode against a local stand-in for Figma's webhooks and API."""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from figmaflet.generateUI import UI
+from figmaflet.serve import make_server, send_event
+
+PASSCODE = "secret"
+
+
+def document(version: str) -> dict:
+    frame = {
+        "id": "1:1",
+        "name": "Home",
+        "type": "FRAME",
+        "absoluteBoundingBox": {"x": 0, "y": 0, "width": 400, "height": 800},
+        "fills": [{"type": "SOLID", "color": {"r": 1, "g": 1, "b": 1, "a": 1}}],
+        "children": [],
+    }
+    return {"version": version, "document": {"children": [{"children": [frame]}]}}
+
+
+class StubFiles:
+    """Stands in for `endpoints.Files`: the file's version moves with each
+    edit made by the test."""
+
+    file_key = "key"
+
+    def __init__(self):
+        self.version = "1"
+
+    def get_version(self) -> str:
+        return self.version
+
+    def get_file(self) -> dict:
+        return document(self.version)
+
+
+@pytest.fixture
+def server(tmp_path):
+    ui = UI(None, "key", tmp_path, file_data=document("1"))
+    ui.figma_file = StubFiles()
+    ui.generate()
+
+    generations = []
+    generate = ui.generate
+
+    def counted_generate():
+        generations.append(ui.version)
+        generate()
+
+    ui.generate = counted_generate
+    server = make_server({"key": ui}, PASSCODE, port=0, debounce=0.2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield ui, generations, f"http://127.0.0.1:{server.server_port}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    # Long enough for a second, unexpected regeneration to happen
+    time.sleep(0.5)
+
+
+def test_burst_regenerates_once(server):
+    ui, generations, url = server
+    ui.figma_file.version = "2"
+
+    statuses = [send_event(url, "key", PASSCODE) for _ in range(5)]
+    statuses.append(send_event(url, "key", "wrong"))
+    statuses.append(requests.post(url, json=["not", "an", "object"]).status_code)
+    statuses.append(requests.post(url, data=b"{not json").status_code)
+    assert statuses == [200] * 5 + [403, 400, 400]
+
+    wait_for(lambda: generations)
+    assert generations == ["2"]
+    assert ui.version == "2"
+
+
+def test_rejected_events_do_not_regenerate(server):
+    ui, generations, url = server
+    ui.figma_file.version = "2"
+
+    assert send_event(url, "key", "wrong") == 403
+    assert requests.post(url, json="FILE_UPDATE").status_code == 400
+    assert send_event(url, "other", PASSCODE) == 200  # not served: ignored
+
+    wait_for(lambda: generations, timeout=0.5)
+    assert generations == []
+
+
+def test_failed_regeneration_is_retried(server):
+    ui, generations, url = server
+    ui.figma_file.version = "2"
+    write_outputs = ui.write_outputs
+
+    def fail_once():
+        ui.write_outputs = write_outputs
+        raise RuntimeError("Figma API error 429.")
+
+    ui.write_outputs = fail_once
+    send_event(url, "key", PASSCODE)
+    wait_for(lambda: generations)
+    assert generations == ["2"]
+
+    # Same version, but the last regeneration of it failed
+    send_event(url, "key", PASSCODE)
+    wait_for(lambda: len(generations) > 1)
+    assert generations == ["2", "2"]
+    assert ui.generated_version == "2"
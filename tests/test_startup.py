@@ -0,0 +1,29 @@
+"""Startup regressions: `figmaflet --help` and every command must stay fast to
+start, so heavy libraries are imported only where they are used."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Imported on first use only (see the lazy imports of figmaflet.cli)
+HEAVY_MODULES = ("requests", "PIL", "jinja2", "numpy")
+
+
+def imported_modules(module: str) -> set:
+    """Top-level modules loaded by importing `module` in a fresh interpreter."""
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {name.split(".")[0] for name in result.stdout.split()}
+
+
+def test_cli_import_defers_heavy_modules():
+    loaded = imported_modules("figmaflet.cli") & set(HEAVY_MODULES)
+    assert not loaded, f"figmaflet.cli imports {sorted(loaded)} at startup"